@@ -0,0 +1,43 @@
+"""Admission control for the async /ask pipeline: bounded concurrency with a bounded wait queue."""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+
+class Rejected(Exception):
+    """The request was not admitted (queue full or queue wait timed out)."""
+
+
+class AdmissionController:
+    """
+    Allow at most `max_concurrency` requests to run at once and at most `max_queue` to wait.
+    Requests beyond that are rejected immediately instead of piling up.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._admitted = 0  # running + waiting
+
+    @property
+    def in_flight(self) -> int:
+        return self._admitted
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._admitted >= self.max_concurrency + self.max_queue:
+            raise Rejected("Server is busy; too many questions in flight.")
+        self._admitted += 1
+        try:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise Rejected(f"Server is busy; no slot freed up within {self.queue_timeout:g}s.") from None
+            try:
+                yield
+            finally:
+                self._slots.release()
+        finally:
+            self._admitted -= 1
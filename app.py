@@ -18,6 +18,7 @@ import streamlit as st
 
 from app_config import DATA_DIR
 from ingest import load_documents
+from generations import writer_lock
 from store import add_documents
 from chat import rag_query
 
@@ -58,20 +59,25 @@ with st.sidebar:
     if st.button("Index documents", type="primary"):
         with st.spinner("Loading and embedding documents..."):
             try:
-                docs = load_documents(
-                    data_dir=DATA_DIR,
-                    github=github_repo or None,
-                    github_token=github_token or None,
-                    notion_api_key=notion_api_key or None,
-                    notion_database_id=notion_database_id or None,
-                    gdrive_credentials_path=gdrive_creds or None,
-                    gdrive_folder_id=gdrive_folder_id or None,
-                )
-                if not docs:
-                    st.warning("No documents found. Add files to the `data` folder or configure a source above.")
-                else:
-                    n = add_documents(docs)
-                    st.success(f"Indexed {n} chunks from {len(docs)} document(s).")
+                # Load + index under the writer lock so a concurrent re-index cannot publish older data over ours
+                with writer_lock():
+                    docs = load_documents(
+                        data_dir=DATA_DIR,
+                        github=github_repo or None,
+                        github_token=github_token or None,
+                        notion_api_key=notion_api_key or None,
+                        notion_database_id=notion_database_id or None,
+                        gdrive_credentials_path=gdrive_creds or None,
+                        gdrive_folder_id=gdrive_folder_id or None,
+                    )
+                    if not docs:
+                        st.warning("No documents found. Add files to the `data` folder or configure a source above.")
+                    else:
+                        report = add_documents(docs)
+                        msg = f"Indexed {report.stored} chunks from {len(docs)} document(s)."
+                        if report.duplicates:
+                            msg += f" Skipped {report.duplicates} near-duplicate chunks ({report.dedup_ratio:.0%})."
+                        st.success(msg)
             except Exception as e:
                 st.error(str(e))
 
@@ -8,7 +8,7 @@ load_dotenv()
 # Paths
 BASE_DIR = Path(__file__).resolve().parent
 CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", str(BASE_DIR / "chroma_db"))
-DATA_DIR = BASE_DIR / "data"  # local files (PDFs, markdown) go here
+DATA_DIR = Path(os.getenv("DATA_DIR", str(BASE_DIR / "data")))  # local files (PDFs, markdown) go here
 
 # Provider: "gemini" (free cloud), "ollama" (local), or "openai" (paid)
 USE_GEMINI = os.getenv("USE_GEMINI", "").lower() in ("1", "true", "yes")
@@ -33,5 +33,35 @@ CHUNK_SIZE = 800
 CHUNK_OVERLAP = 150
 TOP_K = 5
 
+# Near-duplicate chunks (estimated Jaccard >= DEDUP_THRESHOLD) are embedded and stored once,
+# citing every source they came from
+DEDUP = os.getenv("DEDUP", "true").lower() in ("1", "true", "yes")
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+
+# Relevance gate (cosine distance, 0 = identical, 2 = opposite). Chunks farther than
+# RELEVANCE_MAX_DISTANCE, or farther than the best hit + RELEVANCE_MARGIN, are dropped;
+# if none survive, the LLM is skipped. Unset = keep all top_k hits. With a gate set, the search
+# fetches up to RELEVANCE_MAX_K candidates, so the gate can keep more than top_k when they are close.
+RELEVANCE_MAX_DISTANCE = float(os.environ["RELEVANCE_MAX_DISTANCE"]) if os.getenv("RELEVANCE_MAX_DISTANCE") else None
+RELEVANCE_MARGIN = float(os.environ["RELEVANCE_MARGIN"]) if os.getenv("RELEVANCE_MARGIN") else None
+RELEVANCE_MAX_K = int(os.getenv("RELEVANCE_MAX_K", str(2 * TOP_K)))
+
 # Collection name in Chroma
 COLLECTION_NAME = "knowledge_base"
+
+# Multi-process serving (see generations.py): readers never write the index; uploads and
+# re-indexing must go to the indexing (writer) process
+INDEX_READ_ONLY = os.getenv("INDEX_READ_ONLY", "").lower() in ("1", "true", "yes")
+
+# Server: preload provider + collection at startup so the first /ask is fast (see /ready)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+# Server: snapshot file (see snapshot.py) loaded at startup when the index is empty, for fast node bootstrap
+BOOTSTRAP_SNAPSHOT = os.getenv("BOOTSTRAP_SNAPSHOT", "")
+
+# Server: /ask admission control (concurrent pipelines + bounded wait queue) and per-stage timeouts (seconds)
+ASK_MAX_CONCURRENCY = int(os.getenv("ASK_MAX_CONCURRENCY", "8"))
+ASK_MAX_QUEUE = int(os.getenv("ASK_MAX_QUEUE", "16"))
+ASK_QUEUE_TIMEOUT = float(os.getenv("ASK_QUEUE_TIMEOUT", "10"))
+RETRIEVAL_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", "15"))
+GENERATION_TIMEOUT = float(os.getenv("GENERATION_TIMEOUT", "120"))
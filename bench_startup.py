@@ -0,0 +1,92 @@
+"""
+Cold-start benchmark: import time of `main` and first-request latency.
+Run: python bench_startup.py [--runs 5] [--question "..."]
+
+Each run starts two fresh interpreters so nothing is cached between runs, one without and one
+with the warm-up. Reports
+- import: time to `import main` (should not pull in chromadb or provider SDKs)
+- cold_first_ask: first /ask latency with no warm-up, paying for every lazy import and connection
+- warm_up: time of the startup warm-up (provider preload + collection open + dummy query)
+- first_ask / second_ask: /ask latency right after warm-up
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+HEAVY_MODULES = ("chromadb", "google.genai", "openai", "ollama")
+
+_PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import main
+t_import = time.perf_counter() - t0
+heavy = [m for m in HEAVY_MODULES if m in sys.modules]
+
+from fastapi.testclient import TestClient
+from chat import warm_up
+
+out = {"import": t_import, "heavy_on_import": heavy}
+with TestClient(main.app) as client:  # one event loop for warm-up and requests (async provider clients bind to it)
+    if WARM:
+        t0 = time.perf_counter()
+        try:
+            client.portal.call(warm_up)
+        except Exception as e:
+            out["warm_up_error"] = str(e)
+        out["warm_up"] = time.perf_counter() - t0
+
+    for key in ("first_ask", "second_ask"):
+        t0 = time.perf_counter()
+        r = client.post("/ask", json={"question": QUESTION})
+        out[key] = time.perf_counter() - t0
+        out[key + "_status"] = r.status_code
+print(json.dumps(out))
+"""
+
+
+def _run_once(question: str, warm: bool) -> dict:
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\nQUESTION = {question!r}\nWARM = {warm!r}\n" + _PROBE
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).resolve().parent,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "WARMUP_ON_STARTUP": "false"},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip())
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--question", default="What is this document about?")
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.runs):
+        cold = _run_once(args.question, warm=False)
+        run = _run_once(args.question, warm=True)
+        run["cold_first_ask"] = cold["first_ask"]
+        run["cold_first_ask_status"] = cold["first_ask_status"]
+        runs.append(run)
+    print(f"runs: {len(runs)}")
+    for key in ("import", "cold_first_ask", "warm_up", "first_ask", "second_ask"):
+        values = [r[key] * 1000 for r in runs]
+        print(f"{key:>14}: median {statistics.median(values):8.1f} ms   min {min(values):8.1f} ms")
+    heavy = sorted({m for r in runs for m in r["heavy_on_import"]})
+    print(f"heavy modules imported by `import main`: {', '.join(heavy) or 'none'}")
+    statuses = sorted({r[k] for r in runs for k in ("cold_first_ask_status", "first_ask_status")})
+    print(f"/ask status codes: {statuses}")
+    errors = {r["warm_up_error"] for r in runs if "warm_up_error" in r}
+    if errors:
+        print(f"warm-up errors: {'; '.join(errors)}")
+
+
+if __name__ == "__main__":
+    main()
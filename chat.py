@@ -1,24 +1,64 @@
 """RAG: retrieve relevant chunks and generate answer with citations."""
+import asyncio
+
 from app_config import (
-    GEMINI_API_KEY,
+    GENERATION_TIMEOUT,
     GEMINI_CHAT_MODEL,
-    OPENAI_API_KEY,
     OPENAI_CHAT_MODEL,
     OLLAMA_CHAT_MODEL,
+    RELEVANCE_MARGIN,
+    RELEVANCE_MAX_DISTANCE,
+    RELEVANCE_MAX_K,
+    RETRIEVAL_TIMEOUT,
     USE_GEMINI,
     USE_OLLAMA,
 )
-from store import query as store_query
+from providers import (
+    ensure_configured,
+    gemini_client,
+    ollama_async_client,
+    ollama_module,
+    openai_async_client,
+    openai_client,
+    preload,
+)
+from store import SearchFilters, aquery as store_aquery, query as store_query, warm_up as store_warm_up
 
 
 SYSTEM_PROMPT = """You answer questions using only the provided context. If the context does not contain enough information, say so. Always cite the source (e.g. "According to [source]..."). Do not make up facts or sources."""
 
+NO_DOCUMENTS_ANSWER = "No documents have been indexed yet. Add PDFs or markdown files to the `data` folder and run **Index documents** in the sidebar."
+
+NO_MATCHING_ANSWER = "No indexed documents match these filters. Widen or remove the filters and ask again."
+
+NO_RELEVANT_ANSWER = "No relevant documents were found for this question, so I can't answer it from the indexed sources."
+
+
+class StageTimeout(TimeoutError):
+    """A RAG pipeline stage (retrieval or generation) exceeded its time budget."""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"{stage} timed out after {timeout:g}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+def _is_quota_error(e: Exception) -> bool:
+    err_msg = str(e).upper()
+    return "429" in err_msg or "RESOURCE_EXHAUSTED" in err_msg or "QUOTA" in err_msg
+
+
+def _messages(user_message: str) -> list[dict]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_message},
+    ]
+
 
 def _chat_gemini(user_message: str) -> str:
     import time
-    from google.genai import Client
     from google.genai import types
-    client = Client(api_key=GEMINI_API_KEY)
+    client = gemini_client()
     for attempt in range(2):
         try:
             response = client.models.generate_content(
@@ -31,8 +71,7 @@ def _chat_gemini(user_message: str) -> str:
             )
             return (response.text or "").strip()
         except Exception as e:
-            err_msg = str(e).upper()
-            if attempt == 0 and ("429" in err_msg or "RESOURCE_EXHAUSTED" in err_msg or "QUOTA" in err_msg):
+            if attempt == 0 and _is_quota_error(e):
                 time.sleep(50)
                 continue
             raise
@@ -40,49 +79,152 @@ def _chat_gemini(user_message: str) -> str:
 
 
 def _chat_openai(user_message: str) -> str:
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    client = openai_client()
     resp = client.chat.completions.create(
         model=OPENAI_CHAT_MODEL,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_message},
-        ],
+        messages=_messages(user_message),
         temperature=0.2,
     )
     return (resp.choices[0].message.content or "").strip()
 
 
 def _chat_ollama(user_message: str) -> str:
-    import ollama
-    resp = ollama.chat(
+    resp = ollama_module().chat(
         model=OLLAMA_CHAT_MODEL,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_message},
-        ],
+        messages=_messages(user_message),
     )
     return (resp.get("message", {}).get("content") or "").strip()
 
 
-def rag_query(question: str, top_k: int = 5) -> tuple[str, list[dict]]:
+async def _achat_gemini(user_message: str) -> str:
+    from google.genai import types
+    client = gemini_client()
+    for attempt in range(2):
+        try:
+            response = await client.aio.models.generate_content(
+                model=GEMINI_CHAT_MODEL,
+                contents=user_message,
+                config=types.GenerateContentConfig(
+                    system_instruction=SYSTEM_PROMPT,
+                    temperature=0.2,
+                ),
+            )
+            return (response.text or "").strip()
+        except Exception as e:
+            if attempt == 0 and _is_quota_error(e):
+                await asyncio.sleep(50)
+                continue
+            raise
+    return ""
+
+
+async def _achat_openai(user_message: str) -> str:
+    resp = await openai_async_client().chat.completions.create(
+        model=OPENAI_CHAT_MODEL,
+        messages=_messages(user_message),
+        temperature=0.2,
+    )
+    return (resp.choices[0].message.content or "").strip()
+
+
+async def _achat_ollama(user_message: str) -> str:
+    resp = await ollama_async_client().chat(model=OLLAMA_CHAT_MODEL, messages=_messages(user_message))
+    return (resp.get("message", {}).get("content") or "").strip()
+
+
+async def _achat(user_message: str) -> str:
+    if USE_GEMINI:
+        return await _achat_gemini(user_message)
+    if USE_OLLAMA:
+        return await _achat_ollama(user_message)
+    return await _achat_openai(user_message)
+
+
+def _build_user_message(question: str, chunks: list[dict]) -> str:
+    context = "\n\n---\n\n".join(
+        f'[Source: {", ".join(_citations(c))}]\n{c["content"]}' for c in chunks
+    )
+    return f"Context:\n{context}\n\nQuestion: {question}"
+
+
+def _citations(chunk: dict) -> list[str]:
+    """Every source a (de-duplicated) chunk came from."""
+    return (chunk.get("metadata") or {}).get("sources") or [chunk["source"]]
+
+
+def _sources(chunks: list[dict]) -> list[dict]:
+    return [
+        {
+            "source": c["source"],
+            "metadata": c.get("metadata", {}),
+            "distance": c.get("distance"),
+            "citations": _citations(c),
+        }
+        for c in chunks
+    ]
+
+
+def _no_chunks_answer(filters: SearchFilters | None) -> str:
+    """Empty retrieval means an empty index, unless filters narrowed the search."""
+    if filters is not None and filters.to_where() is not None:
+        return NO_MATCHING_ANSWER
+    return NO_DOCUMENTS_ANSWER
+
+
+def _search_k(top_k: int, max_distance: float | None, margin: float | None) -> int:
+    """How many candidates to retrieve: widened to RELEVANCE_MAX_K when a relevance gate will trim them."""
+    if max_distance is None and margin is None:
+        return top_k
+    return max(top_k, RELEVANCE_MAX_K)
+
+
+def select_relevant(
+    chunks: list[dict], max_distance: float | None, margin: float | None, top_k: int | None = None
+) -> list[dict]:
+    """
+    Adaptive top-k: keep chunks within max_distance and within margin of the best hit.
+    Chunks must be sorted by distance (as returned by the store). Without cosine distances
+    (an index built before cosine) the gate can't judge relevance and keeps the top_k nearest.
+    """
+    if not chunks:
+        return chunks
+    best = chunks[0].get("distance")
+    if best is None:
+        return chunks[:top_k]
+    limit = max_distance if max_distance is not None else float("inf")
+    if margin is not None:
+        limit = min(limit, best + margin)
+    return [c for c in chunks if c["distance"] <= limit]
+
+
+async def warm_up() -> str:
+    """Preload the configured provider, open the collection and run a dummy async query. Returns the provider name."""
+    name = await asyncio.to_thread(preload)
+    await store_warm_up()
+    return name
+
+
+def rag_query(
+    question: str,
+    top_k: int = 5,
+    filters: SearchFilters | None = None,
+    max_distance: float | None = RELEVANCE_MAX_DISTANCE,
+    margin: float | None = RELEVANCE_MARGIN,
+) -> tuple[str, list[dict]]:
     """
-    Run RAG: retrieve chunks, build context, call LLM. Returns (answer, list of sources).
+    Run RAG: retrieve chunks (optionally restricted by metadata filters), drop irrelevant ones,
+    build context, call LLM. Returns (answer, list of sources). The LLM is skipped if nothing is relevant.
     """
-    if not USE_GEMINI and not USE_OLLAMA and not OPENAI_API_KEY:
-        raise ValueError("Set GEMINI_API_KEY+USE_GEMINI=true, or USE_OLLAMA=true, or OPENAI_API_KEY in .env")
+    ensure_configured()
 
-    chunks = store_query(question, top_k=top_k)
+    chunks = store_query(question, top_k=_search_k(top_k, max_distance, margin), filters=filters)
     if not chunks:
-        return (
-            "No documents have been indexed yet. Add PDFs or markdown files to the `data` folder and run **Index documents** in the sidebar.",
-            [],
-        )
+        return _no_chunks_answer(filters), []
+    chunks = select_relevant(chunks, max_distance, margin, top_k)
+    if not chunks:
+        return NO_RELEVANT_ANSWER, []
 
-    context = "\n\n---\n\n".join(
-        f'[Source: {c["source"]}]\n{c["content"]}' for c in chunks
-    )
-    user_message = f"Context:\n{context}\n\nQuestion: {question}"
+    user_message = _build_user_message(question, chunks)
 
     if USE_GEMINI:
         answer = _chat_gemini(user_message)
@@ -91,5 +233,38 @@ def rag_query(question: str, top_k: int = 5) -> tuple[str, list[dict]]:
     else:
         answer = _chat_openai(user_message)
 
-    sources = [{"source": c["source"], "metadata": c.get("metadata", {})} for c in chunks]
-    return answer, sources
+    return answer, _sources(chunks)
+
+
+async def _with_timeout(stage: str, coro, timeout: float):
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        raise StageTimeout(stage, timeout) from None
+
+
+async def arag_query(
+    question: str,
+    top_k: int = 5,
+    filters: SearchFilters | None = None,
+    max_distance: float | None = RELEVANCE_MAX_DISTANCE,
+    margin: float | None = RELEVANCE_MARGIN,
+    retrieval_timeout: float = RETRIEVAL_TIMEOUT,
+    generation_timeout: float = GENERATION_TIMEOUT,
+) -> tuple[str, list[dict]]:
+    """
+    Async rag_query used by the API. Each stage is bounded by its timeout (raises StageTimeout);
+    cancelling the calling task cancels the in-flight provider request.
+    """
+    ensure_configured()
+
+    k = _search_k(top_k, max_distance, margin)
+    chunks = await _with_timeout("retrieval", store_aquery(question, top_k=k, filters=filters), retrieval_timeout)
+    if not chunks:
+        return _no_chunks_answer(filters), []
+    chunks = select_relevant(chunks, max_distance, margin, top_k)
+    if not chunks:
+        return NO_RELEVANT_ANSWER, []
+
+    answer = await _with_timeout("generation", _achat(_build_user_message(question, chunks)), generation_timeout)
+    return answer, _sources(chunks)
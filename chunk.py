@@ -5,6 +5,15 @@ from app_config import CHUNK_SIZE, CHUNK_OVERLAP
 from ingest import Document
 
 
+def path_prefixes(path: str) -> list[str]:
+    """
+    Every directory prefix of a relative posix path, plus the path itself ("docs", "docs/api",
+    "docs/api/a.md"). Chroma has no prefix operator, so path filters match this list with $contains.
+    """
+    parts = [p for p in path.split("/") if p]
+    return ["/".join(parts[:d]) for d in range(1, len(parts) + 1)]
+
+
 def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
     """Split text into overlapping chunks by character count."""
     if not text or len(text) <= chunk_size:
@@ -34,6 +43,8 @@ def chunk_document(doc: Document, chunk_size: int = CHUNK_SIZE, overlap: int = C
     chunks = chunk_text(doc.content, chunk_size, overlap)
     for i, text in enumerate(chunks):
         meta = {**(doc.meta or {}), "source": doc.source}
+        if meta.get("path"):
+            meta["path_prefixes"] = path_prefixes(str(meta["path"]))
         if len(chunks) > 1:
             meta["chunk_index"] = i
         yield text, meta
@@ -0,0 +1,73 @@
+"""Near-duplicate chunk detection with MinHash + LSH banding, so each cluster is embedded once."""
+import re
+import zlib
+
+from app_config import DEDUP_THRESHOLD
+
+SHINGLE_SIZE = 5  # characters
+NUM_PERM = 64
+BANDS = 8  # 8 bands x 8 rows: pairs above ~0.77 Jaccard become candidates
+
+_PRIME = (1 << 31) - 1
+
+
+def _shingles(text: str) -> set[int]:
+    norm = re.sub(r"\s+", " ", text.lower()).strip()
+    if len(norm) <= SHINGLE_SIZE:
+        return {zlib.crc32(norm.encode())}
+    return {zlib.crc32(norm[i : i + SHINGLE_SIZE].encode()) for i in range(len(norm) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signatures(texts: list[str]):
+    """Return a (len(texts), NUM_PERM) array of MinHash signatures over character shingles."""
+    import numpy as np
+
+    rng = np.random.default_rng(0)  # fixed permutations: signatures are comparable across runs
+    a = rng.integers(1, _PRIME, size=NUM_PERM, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=NUM_PERM, dtype=np.uint64)
+    sigs = np.empty((len(texts), NUM_PERM), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        h = np.fromiter(_shingles(text), dtype=np.uint64) % _PRIME
+        sigs[i] = ((h[:, None] * a + b) % _PRIME).min(axis=0)
+    return sigs
+
+
+def near_duplicate_clusters(texts: list[str], threshold: float = DEDUP_THRESHOLD) -> list[list[int]]:
+    """
+    Group indices of texts whose estimated Jaccard similarity is >= threshold (transitively).
+    Every index appears in exactly one cluster; clusters and their members keep input order,
+    so cluster[0] is the first occurrence.
+    """
+    if not texts:
+        return []
+    sigs = minhash_signatures(texts)
+    rows = NUM_PERM // BANDS
+
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    checked: set[tuple[int, int]] = set()
+    for band in range(BANDS):
+        buckets: dict[bytes, list[int]] = {}
+        for i, key in enumerate(sigs[:, band * rows : (band + 1) * rows]):
+            buckets.setdefault(key.tobytes(), []).append(i)
+        for members in buckets.values():
+            first = members[0]
+            for other in members[1:]:
+                if (first, other) in checked:
+                    continue
+                checked.add((first, other))
+                if (sigs[first] == sigs[other]).mean() >= threshold:
+                    ra, rb = find(first), find(other)
+                    if ra != rb:
+                        parent[max(ra, rb)] = min(ra, rb)
+
+    clusters: dict[int, list[int]] = {}
+    for i in range(len(texts)):
+        clusters.setdefault(find(i), []).append(i)
+    return list(clusters.values())
@@ -0,0 +1,123 @@
+"""
+Versioned index generations, so several server processes can share CHROMA_PERSIST_DIR.
+
+Every (re)index is built into a fresh directory CHROMA_PERSIST_DIR/gen-<n> by a single writer
+(serialized across processes by a file lock) and published by atomically replacing the
+CURRENT pointer file. Readers resolve CURRENT on every query and move to the new generation
+for subsequent queries, while in-flight queries finish on the generation they started on.
+Published generations are never modified; the oldest ones are pruned after KEEP_GENERATIONS.
+"""
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator
+
+from app_config import CHROMA_PERSIST_DIR, INDEX_READ_ONLY
+
+ROOT = Path(CHROMA_PERSIST_DIR)
+KEEP_GENERATIONS = 3
+
+_CURRENT = "CURRENT"
+_LOCK = "writer.lock"
+_PREFIX = "gen-"
+
+_held = threading.local()  # writer lock depth for this thread, so nested writes don't self-deadlock
+
+
+class ReadOnlyIndex(Exception):
+    """This process is configured as a reader (INDEX_READ_ONLY) and may not write the index."""
+
+
+def current() -> str | None:
+    """Name of the published generation, or None for the legacy un-versioned layout."""
+    try:
+        return (ROOT / _CURRENT).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def generation_dir(gen: str | None) -> Path:
+    return ROOT / gen if gen else ROOT
+
+
+def _lock_file(f: IO[bytes]) -> None:
+    try:
+        import fcntl
+    except ImportError:  # Windows
+        import msvcrt
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return
+            except OSError:
+                time.sleep(0.1)
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+def _unlock_file(f: IO[bytes]) -> None:
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def writer_lock(local_bootstrap: bool = False) -> Iterator[None]:
+    """
+    Exclusive, cross-process writer lock (blocks until free; reentrant within a thread).
+    Read-only replicas may only take it for local_bootstrap (loading a snapshot into an empty index).
+    """
+    depth = getattr(_held, "depth", 0)
+    if INDEX_READ_ONLY and not depth and not local_bootstrap:
+        raise ReadOnlyIndex("This server is a read-only index replica; send writes to the indexing process.")
+    if depth:
+        _held.depth = depth + 1
+        try:
+            yield
+        finally:
+            _held.depth -= 1
+        return
+    ROOT.mkdir(parents=True, exist_ok=True)
+    with open(ROOT / _LOCK, "a+b") as f:
+        _lock_file(f)
+        _held.depth = 1
+        try:
+            yield
+        finally:
+            _held.depth = 0
+            _unlock_file(f)
+
+
+def new_generation(copy_current: bool) -> tuple[str, Path]:
+    """Create the directory for the next generation (optionally seeded with the current one). Hold writer_lock."""
+    gen = f"{_PREFIX}{time.time_ns()}"
+    path = ROOT / gen
+    src = generation_dir(current())
+    if copy_current and (src / "chroma.sqlite3").exists():
+        shutil.copytree(src, path, ignore=shutil.ignore_patterns(f"{_PREFIX}*", _CURRENT, f"{_CURRENT}.*", _LOCK))
+    else:
+        path.mkdir(parents=True)
+    return gen, path
+
+
+def publish(gen: str) -> None:
+    """Atomically make `gen` the generation readers see, then prune old ones. Hold writer_lock."""
+    tmp = ROOT / f"{_CURRENT}.{os.getpid()}.tmp"
+    tmp.write_text(gen)
+    os.replace(tmp, ROOT / _CURRENT)
+    old = sorted(p for p in ROOT.glob(f"{_PREFIX}*") if p.is_dir() and p.name != gen)
+    for path in old[: max(len(old) - (KEEP_GENERATIONS - 1), 0)]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def discard(path: Path) -> None:
+    """Remove an unpublished generation after a failed build."""
+    shutil.rmtree(path, ignore_errors=True)
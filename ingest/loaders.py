@@ -1,5 +1,6 @@
 """Load documents from PDF, Markdown, GitHub, Notion, and Google Drive."""
 from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
 from typing import Iterator
 
@@ -34,7 +35,7 @@ def load_pdf(path: Path) -> Iterator[Document]:
     for i, page in enumerate(reader.pages):
         text = page.extract_text()
         if text and text.strip():
-            yield Document(content=text.strip(), source=source, meta={"page": i + 1})
+            yield Document(content=text.strip(), source=source, meta={"source_type": "pdf", "page": i + 1})
 
 
 # --- Markdown / plain text ---
@@ -49,7 +50,7 @@ def load_text(path: Path) -> Iterator[Document]:
     else:
         return
     if text.strip():
-        yield Document(content=text.strip(), source=str(path), meta={})
+        yield Document(content=text.strip(), source=str(path), meta={"source_type": "text"})
 
 
 # --- GitHub ---
@@ -87,7 +88,7 @@ def load_github_repo(owner: str, repo: str, branch: str = "main", token: str | N
             continue
         if raw.strip():
             source = f"github.com/{owner}/{repo}/blob/{branch or 'main'}/{path}"
-            yield Document(content=raw.strip(), source=source, meta={"path": path})
+            yield Document(content=raw.strip(), source=source, meta={"source_type": "github", "path": path})
 
 
 # --- Notion ---
@@ -116,7 +117,7 @@ def load_notion(api_key: str, database_id: str | None = None, page_ids: list[str
                             parts.append(rt["plain_text"])
             if parts:
                 source = f"notion.so/page/{page_id}"
-                yield Document(content="\n".join(parts).strip(), source=source, meta={"page_id": page_id})
+                yield Document(content="\n".join(parts).strip(), source=source, meta={"source_type": "notion", "page_id": page_id})
         except Exception:
             continue
 
@@ -136,7 +137,7 @@ def load_google_drive(credentials_path: str, folder_id: str) -> Iterator[Documen
     result = service.files().list(
         q=f"'{folder_id}' in parents",
         pageSize=100,
-        fields="files(id, name, mimeType)",
+        fields="files(id, name, mimeType, modifiedTime)",
     ).execute()
     for f in result.get("files", []):
         mime = f.get("mimeType", "")
@@ -147,7 +148,10 @@ def load_google_drive(credentials_path: str, folder_id: str) -> Iterator[Documen
             text = content.decode("utf-8", errors="replace").strip()
             if text:
                 source = f"drive.google.com/file/d/{f['id']}"
-                yield Document(content=text, source=source, meta={"name": f.get("name", "")})
+                meta = {"source_type": "gdrive", "name": f.get("name", "")}
+                if f.get("modifiedTime"):
+                    meta["modified_ts"] = datetime.fromisoformat(f["modifiedTime"].replace("Z", "+00:00")).timestamp()
+                yield Document(content=text, source=source, meta=meta)
         except Exception:
             continue
 
@@ -181,11 +185,18 @@ def load_documents(
         suf = path.suffix.lower()
         try:
             if suf == ".pdf":
-                out.extend(load_pdf(path))
+                loaded = list(load_pdf(path))
             elif suf in (".md", ".markdown", ".txt", ".rst"):
-                out.extend(load_text(path))
+                loaded = list(load_text(path))
+            else:
+                continue
         except Exception:
             continue
+        # Fields used by filtered retrieval (path prefix, modified-after)
+        file_meta = {"path": path.relative_to(data_dir).as_posix(), "modified_ts": path.stat().st_mtime}
+        for doc in loaded:
+            doc.meta.update(file_meta)
+        out.extend(loaded)
 
     if github:
         parts = github.strip().split(":", 1)
@@ -0,0 +1,422 @@
+"""
+Concurrent load test for the FastAPI service: throughput, p50/p95/p99 latency and error rates.
+Run: python loadtest.py --stub openai --concurrency 1,8,32,64 --duration 20 --upload-interval 5
+     python loadtest.py --url http://localhost:8000 --concurrency 16 --questions questions.txt
+
+In-process (default) drives main.app through httpx's ASGI transport against a throwaway synthetic
+corpus in a temp directory, with stub clients standing in for the Gemini, OpenAI or Ollama SDK
+(--stub), so it runs fully offline. The stubs go through the same provider code paths as the
+real SDKs and sleep for --embed-latency / --llm-latency to mimic network time.
+With --url the running server and its configured provider are used as-is.
+
+Each concurrency level is run for --duration seconds by that many closed-loop /ask clients;
+--upload-interval adds an /upload (which re-indexes everything) every N seconds alongside.
+Against --url this needs --allow-uploads; the uploaded documents are deleted at the end of the run.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import types
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+DEFAULT_QUESTIONS = [
+    "What does the billing service do when a payment fails?",
+    "How is the search index rebuilt?",
+    "Which regions does the deployment guide cover?",
+    "Summarize the onboarding checklist.",
+    "What are the retention rules for audit logs?",
+    "Who owns the incident response runbook?",
+    "What is the capital of Mongolia?",  # off-corpus
+]
+
+_TOPICS = ["billing", "search", "deployment", "onboarding", "audit", "incident", "storage", "networking"]
+_WORDS = (
+    "service request index region guide checklist log retention owner runbook payment failure retry queue "
+    "cluster replica snapshot latency budget alert dashboard rollout config policy access token"
+).split()
+
+
+# --- Stub providers -------------------------------------------------------
+
+STUB_DIM = 64
+
+
+def _stub_vector(text: str) -> list[float]:
+    """Deterministic hashed bag-of-words embedding, so retrieval still ranks sensibly."""
+    vec = [0.0] * STUB_DIM
+    for word in re.findall(r"\w+", text.lower()):
+        h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), "little")
+        vec[h % STUB_DIM] += 1.0 if h & 1 << 31 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+@dataclass
+class StubLatency:
+    embed: float  # mean seconds per embedding call
+    llm: float  # mean seconds per generation call
+
+    def sample(self, kind: str) -> float:
+        """A jittered latency for one "embed" or "llm" call."""
+        mean = getattr(self, kind)
+        return max(0.0, random.gauss(mean, mean * 0.25))
+
+
+def _ns(**kw: Any) -> types.SimpleNamespace:
+    return types.SimpleNamespace(**kw)
+
+
+STUB_ANSWER = "Stub answer based on the provided context [Source: stub]."
+
+
+def _make_stub_clients(provider: str, latency: StubLatency) -> dict[str, Any]:
+    """Return replacements for the providers.* client getters, mimicking each SDK's surface."""
+
+    def sync_sleep(kind: str) -> None:
+        time.sleep(latency.sample(kind))
+
+    async def async_sleep(kind: str) -> None:
+        await asyncio.sleep(latency.sample(kind))
+
+    if provider == "gemini":
+
+        def embed_result(contents: Any) -> Any:
+            texts = [contents] if isinstance(contents, str) else list(contents)
+            return _ns(embeddings=[_ns(values=_stub_vector(t)) for t in texts])
+
+        class Models:
+            def embed_content(self, model: str, contents: Any) -> Any:
+                sync_sleep("embed")
+                return embed_result(contents)
+
+            def generate_content(self, model: str, contents: Any, config: Any = None) -> Any:
+                sync_sleep("llm")
+                return _ns(text=STUB_ANSWER)
+
+        class AsyncModels:
+            async def embed_content(self, model: str, contents: Any) -> Any:
+                await async_sleep("embed")
+                return embed_result(contents)
+
+            async def generate_content(self, model: str, contents: Any, config: Any = None) -> Any:
+                await async_sleep("llm")
+                return _ns(text=STUB_ANSWER)
+
+        client = _ns(models=Models(), aio=_ns(models=AsyncModels()))
+        return {"gemini_client": lambda: client}
+
+    if provider == "openai":
+
+        def embed_result(texts: list[str]) -> Any:
+            return _ns(data=[_ns(embedding=_stub_vector(t)) for t in texts])
+
+        def chat_result() -> Any:
+            return _ns(choices=[_ns(message=_ns(content=STUB_ANSWER))])
+
+        class Embeddings:
+            def create(self, input: list[str], model: str) -> Any:
+                sync_sleep("embed")
+                return embed_result(input)
+
+        class Completions:
+            def create(self, model: str, messages: Any, temperature: float = 0.0) -> Any:
+                sync_sleep("llm")
+                return chat_result()
+
+        class AsyncEmbeddings:
+            async def create(self, input: list[str], model: str) -> Any:
+                await async_sleep("embed")
+                return embed_result(input)
+
+        class AsyncCompletions:
+            async def create(self, model: str, messages: Any, temperature: float = 0.0) -> Any:
+                await async_sleep("llm")
+                return chat_result()
+
+        client = _ns(embeddings=Embeddings(), chat=_ns(completions=Completions()))
+        async_client = _ns(embeddings=AsyncEmbeddings(), chat=_ns(completions=AsyncCompletions()))
+        return {"openai_client": lambda: client, "openai_async_client": lambda: async_client}
+
+    class Ollama:
+        def embeddings(self, model: str, prompt: str) -> dict:
+            sync_sleep("embed")
+            return {"embedding": _stub_vector(prompt)}
+
+        def chat(self, model: str, messages: Any) -> dict:
+            sync_sleep("llm")
+            return {"message": {"content": STUB_ANSWER}}
+
+    class AsyncOllama:
+        async def embeddings(self, model: str, prompt: str) -> dict:
+            await async_sleep("embed")
+            return {"embedding": _stub_vector(prompt)}
+
+        async def chat(self, model: str, messages: Any) -> dict:
+            await async_sleep("llm")
+            return {"message": {"content": STUB_ANSWER}}
+
+    module, async_client = Ollama(), AsyncOllama()
+    return {"ollama_module": lambda: module, "ollama_async_client": lambda: async_client}
+
+
+def install_stub_providers(provider: str, latency: StubLatency) -> None:
+    """Point the app's provider client getters at offline stubs. Call after configure_stub_env()."""
+    import chat
+    import providers
+    import store
+
+    if provider == "gemini":
+        try:
+            from google.genai import types as _types  # noqa: F401
+        except ImportError:
+            # chat builds a GenerateContentConfig; a plain container is enough for the stub client
+            genai = types.ModuleType("google.genai")
+            genai.types = types.SimpleNamespace(GenerateContentConfig=lambda **kw: types.SimpleNamespace(**kw))
+            sys.modules.setdefault("google", types.ModuleType("google"))
+            sys.modules["google.genai"] = genai
+            sys.modules["google.genai.types"] = genai.types
+
+    for name, getter in _make_stub_clients(provider, latency).items():
+        for module in (providers, store, chat):
+            if hasattr(module, name):
+                setattr(module, name, getter)
+
+
+def configure_stub_env(provider: str, workdir: Path) -> None:
+    """Select `provider` and a throwaway data/index directory. Must run before importing app modules."""
+    os.environ.update(
+        {
+            "USE_GEMINI": "true" if provider == "gemini" else "false",
+            "USE_OLLAMA": "true" if provider == "ollama" else "false",
+            "GEMINI_API_KEY": "stub",
+            "OPENAI_API_KEY": "stub",
+            "DATA_DIR": str(workdir / "data"),
+            "CHROMA_PERSIST_DIR": str(workdir / "chroma_db"),
+            "WARMUP_ON_STARTUP": "false",
+            "BOOTSTRAP_SNAPSHOT": "",
+            "INDEX_READ_ONLY": "false",
+        }
+    )
+
+
+def _synthetic_doc(rng: random.Random, topic: str, n_words: int = 600) -> str:
+    lines = [f"# {topic.title()} guide", ""]
+    words = [rng.choice(_WORDS + [topic] * 3) for _ in range(n_words)]
+    for i in range(0, len(words), 12):
+        lines.append(" ".join(words[i : i + 12]) + ".")
+    return "\n".join(lines)
+
+
+def seed_corpus(data_dir: Path, n_docs: int) -> None:
+    rng = random.Random(0)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(n_docs):
+        topic = _TOPICS[i % len(_TOPICS)]
+        (data_dir / f"{topic}-{i}.md").write_text(_synthetic_doc(rng, topic))
+
+
+# --- Load generation ------------------------------------------------------
+
+
+@dataclass
+class Sample:
+    endpoint: str
+    status: int  # 0 = transport error / timeout
+    latency: float
+
+
+@dataclass
+class StageResult:
+    concurrency: int
+    elapsed: float
+    samples: list[Sample] = field(default_factory=list)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of an unsorted list (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+async def _timed(client: Any, samples: list[Sample], endpoint: str, method: str, url: str, **kw: Any) -> Any:
+    t0 = time.perf_counter()
+    resp = None
+    try:
+        resp = await client.request(method, url, **kw)
+        status = resp.status_code
+    except Exception:
+        status = 0
+    samples.append(Sample(endpoint, status, time.perf_counter() - t0))
+    return resp
+
+
+async def _ask_worker(client: Any, questions: list[str], deadline: float, samples: list[Sample]) -> None:
+    while time.perf_counter() < deadline:
+        resp = await _timed(client, samples, "/ask", "POST", "/ask", json={"question": random.choice(questions)})
+        if resp is not None and resp.status_code == 429:
+            # Back off like a well-behaved client instead of hammering the admission queue
+            await asyncio.sleep(float(resp.headers.get("Retry-After", "1")))
+
+
+async def _upload_worker(
+    client: Any, interval: float, deadline: float, samples: list[Sample], uploaded: list[str]
+) -> None:
+    rng = random.Random(1)
+    while True:
+        await asyncio.sleep(interval)
+        if time.perf_counter() >= deadline:
+            return
+        name = f"loadtest-upload-{len(uploaded) + 1}.md"
+        uploaded.append(name)  # before the request: a failed re-index still leaves the file behind
+        files = {"file": (name, _synthetic_doc(rng, rng.choice(_TOPICS)).encode(), "text/markdown")}
+        await _timed(client, samples, "/upload", "POST", "/upload", files=files)
+
+
+async def remove_uploads(client: Any, uploaded: list[str]) -> None:
+    """Delete the documents this run uploaded, so a real server's corpus is left as it was."""
+    for name in dict.fromkeys(uploaded):
+        try:
+            resp = await client.delete(f"/documents/{name}")
+            ok = resp.status_code in (200, 404)
+        except Exception:
+            ok = False
+        if not ok:
+            print(f"warning: could not delete uploaded document {name}; remove it by hand", file=sys.stderr)
+
+
+async def run_stage(
+    client: Any,
+    concurrency: int,
+    duration: float,
+    questions: list[str],
+    upload_interval: float,
+    uploaded: list[str] | None = None,
+) -> StageResult:
+    """Run one stage. Names of uploaded documents are appended to `uploaded`."""
+    samples: list[Sample] = []
+    start = time.perf_counter()
+    deadline = start + duration
+    tasks = [asyncio.create_task(_ask_worker(client, questions, deadline, samples)) for _ in range(concurrency)]
+    if upload_interval > 0:
+        uploads = uploaded if uploaded is not None else []
+        tasks.append(asyncio.create_task(_upload_worker(client, upload_interval, deadline, samples, uploads)))
+    await asyncio.gather(*tasks)
+    return StageResult(concurrency, time.perf_counter() - start, samples)
+
+
+def summarize(stage: StageResult) -> dict[str, Any]:
+    out: dict[str, Any] = {"concurrency": stage.concurrency, "elapsed_s": round(stage.elapsed, 2), "endpoints": {}}
+    for endpoint in sorted({s.endpoint for s in stage.samples}):
+        rows = [s for s in stage.samples if s.endpoint == endpoint]
+        ok = [s.latency for s in rows if 200 <= s.status < 300]
+        statuses: dict[str, int] = {}
+        for s in rows:
+            statuses[str(s.status)] = statuses.get(str(s.status), 0) + 1
+        out["endpoints"][endpoint] = {
+            "requests": len(rows),
+            "throughput_rps": round(len(ok) / stage.elapsed, 2),
+            "error_rate": round(1 - len(ok) / len(rows), 4),
+            "p50_ms": round(percentile(ok, 50) * 1000, 1),
+            "p95_ms": round(percentile(ok, 95) * 1000, 1),
+            "p99_ms": round(percentile(ok, 99) * 1000, 1),
+            "statuses": statuses,
+        }
+    return out
+
+
+def print_table(summaries: list[dict[str, Any]]) -> None:
+    header = f"{'conc':>5} {'endpoint':<8} {'reqs':>6} {'ok rps':>8} {'err %':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses"
+    print(header)
+    print("-" * len(header))
+    for summary in summaries:
+        for endpoint, m in summary["endpoints"].items():
+            print(
+                f"{summary['concurrency']:>5} {endpoint:<8} {m['requests']:>6} {m['throughput_rps']:>8.2f} "
+                f"{m['error_rate'] * 100:>6.1f} {m['p50_ms']:>8.1f} {m['p95_ms']:>8.1f} {m['p99_ms']:>8.1f}  {m['statuses']}"
+            )
+
+
+async def _run(args: argparse.Namespace, questions: list[str]) -> list[dict[str, Any]]:
+    import httpx
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        from main import app
+
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout)
+
+    summaries = []
+    uploaded: list[str] = []
+    async with client:
+        try:
+            for concurrency in args.concurrency:
+                stage = await run_stage(client, concurrency, args.duration, questions, args.upload_interval, uploaded)
+                summaries.append(summarize(stage))
+        finally:
+            if args.url:  # in-process runs use a throwaway data directory
+                await remove_uploads(client, uploaded)
+    return summaries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="target a running server instead of main.app in-process")
+    parser.add_argument("--stub", choices=("gemini", "openai", "ollama"), default="openai", help="stubbed provider (in-process only)")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrent /ask clients, one stage each")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per stage")
+    parser.add_argument("--questions", help="file with one question per line (repeat a line to weight it)")
+    parser.add_argument("--upload-interval", type=float, default=0.0, help="seconds between /upload calls (0 = none)")
+    parser.add_argument(
+        "--allow-uploads", action="store_true", help="allow --upload-interval against --url (uploads are deleted afterwards)"
+    )
+    parser.add_argument("--docs", type=int, default=40, help="synthetic documents to seed (in-process only)")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="mean stub embedding latency, seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="mean stub generation latency, seconds")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client-side request timeout, seconds")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    if args.url and args.upload_interval > 0 and not args.allow_uploads:
+        parser.error(
+            "--upload-interval with --url adds documents to the server's data directory and re-indexes it; "
+            "pass --allow-uploads to confirm (they are deleted again at the end of the run)"
+        )
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        questions = [q.strip() for q in Path(args.questions).read_text().splitlines() if q.strip()]
+
+    with tempfile.TemporaryDirectory(prefix="rag-loadtest-") as tmp:
+        if not args.url:
+            configure_stub_env(args.stub, Path(tmp))
+            install_stub_providers(args.stub, StubLatency(embed=args.embed_latency, llm=args.llm_latency))
+            from app_config import DATA_DIR
+            from ingest import load_documents
+            from store import add_documents
+
+            seed_corpus(DATA_DIR, args.docs)
+            add_documents(load_documents(data_dir=DATA_DIR))
+        summaries = asyncio.run(_run(args, questions))
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    else:
+        print_table(summaries)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,87 @@
 """FastAPI backend for the RAG document Q&A portal.
 
 Endpoints:
-- GET    /health              -> simple health check
+- GET    /health              -> simple health check (liveness)
+- GET    /ready               -> readiness: 200 once the startup warm-up has finished, else 503
 - GET    /documents           -> list indexed local documents under DATA_DIR
 - POST   /upload              -> upload a file into DATA_DIR and re-index all docs
 - DELETE /documents/{filename} -> delete a document and re-index
 - POST   /ask                 -> run RAG over indexed docs and return answer + sources
+- GET    /snapshot            -> download a snapshot of the index (see snapshot.py)
+- POST   /snapshot            -> replace the index with an uploaded snapshot
+
+/ask is fully async: at most ASK_MAX_CONCURRENCY questions run at once, up to ASK_MAX_QUEUE
+more wait, and anything beyond that gets 429. Retrieval and generation have their own
+timeouts (504), and the pipeline is cancelled if the client disconnects.
+
+Several workers may share one index (see generations.py): writes build and publish a new
+index generation under a cross-process lock, and every worker picks it up on its next query.
+With INDEX_READ_ONLY=true a server only serves queries and rejects writes with 403.
 """
+import asyncio
+import os
+import tempfile
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Any, List
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse
 from pydantic import BaseModel
-
-from app_config import DATA_DIR
-from chat import rag_query
+from starlette.background import BackgroundTask
+
+from admission import AdmissionController, Rejected
+from app_config import (
+    ASK_MAX_CONCURRENCY,
+    ASK_MAX_QUEUE,
+    ASK_QUEUE_TIMEOUT,
+    BOOTSTRAP_SNAPSHOT,
+    DATA_DIR,
+    INDEX_READ_ONLY,
+    WARMUP_ON_STARTUP,
+)
+from chat import StageTimeout, arag_query, warm_up
+from generations import current as current_generation, writer_lock
 from ingest import Document, load_documents
-from store import add_documents
+from snapshot import bootstrap, export_snapshot, import_snapshot
+from store import IngestReport, SearchFilters, add_documents
+
+
+_STARTUP = WARMUP_ON_STARTUP or bool(BOOTSTRAP_SNAPSHOT)
+
+# Startup (snapshot bootstrap + warm-up) state, reported by /ready
+_readiness: dict[str, Any] = {"ready": not _STARTUP, "provider": None, "index_version": None, "error": None}
+
+
+async def _start_up() -> None:
+    try:
+        if BOOTSTRAP_SNAPSHOT:
+            manifest = await asyncio.to_thread(bootstrap, BOOTSTRAP_SNAPSHOT)
+            _readiness["index_version"] = manifest["index_version"] if manifest else None
+        if WARMUP_ON_STARTUP:
+            _readiness["provider"] = await warm_up()  # on the serving loop, where /ask's async clients live
+    except Exception as e:
+        _readiness["error"] = str(e)
+    else:
+        _readiness["ready"] = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Run in the background so /health answers immediately while start-up is in flight
+    task = asyncio.create_task(_start_up()) if _STARTUP else None
+    yield
+    if task is not None:
+        task.cancel()
 
 
-app = FastAPI(title="RAG Document Q&A API")
+app = FastAPI(title="RAG Document Q&A API", lifespan=lifespan)
+
+admission = AdmissionController(ASK_MAX_CONCURRENCY, ASK_MAX_QUEUE, ASK_QUEUE_TIMEOUT)
+
+# How often /ask checks whether the client has gone away (seconds)
+DISCONNECT_POLL_INTERVAL = 0.5
 
 
 # Allow local React dev server by default
@@ -36,10 +97,29 @@ app.add_middleware(
 class Source(BaseModel):
     source: str
     metadata: dict[str, Any] | None = None
+    distance: float | None = None  # cosine distance to the question; lower is more relevant (None on L2 indexes)
+    citations: List[str] | None = None  # all sources a de-duplicated chunk appeared in
 
 
 class AskRequest(BaseModel):
     question: str
+    # Optional filters, applied inside the vector search
+    source: str | None = None
+    source_type: str | None = None
+    path_prefix: str | None = None
+    page_from: int | None = None
+    page_to: int | None = None
+    modified_after: float | None = None
+
+    def filters(self) -> SearchFilters:
+        return SearchFilters(
+            source=self.source,
+            source_type=self.source_type,
+            path_prefix=self.path_prefix,
+            page_from=self.page_from,
+            page_to=self.page_to,
+            modified_after=self.modified_after,
+        )
 
 
 class AskResponse(BaseModel):
@@ -59,6 +139,21 @@ def health() -> dict:
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready() -> JSONResponse:
+    if _readiness["ready"]:
+        return JSONResponse(
+            {
+                "status": "ready",
+                "provider": _readiness["provider"],
+                "index_version": _readiness["index_version"],
+                "index_generation": current_generation(),
+            }
+        )
+    status = "error" if _readiness["error"] else "warming_up"
+    return JSONResponse({"status": status, "error": _readiness["error"]}, status_code=503)
+
+
 @app.get("/documents", response_model=List[DocumentInfo])
 def list_documents() -> List[DocumentInfo]:
     DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -78,6 +173,11 @@ def list_documents() -> List[DocumentInfo]:
     return docs
 
 
+def _require_writer() -> None:
+    if INDEX_READ_ONLY:
+        raise HTTPException(status_code=403, detail="This server is a read-only index replica; send writes to the indexing server.")
+
+
 def _save_uploaded_file(file: UploadFile) -> Path:
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     safe_name = Path(file.filename or "uploaded").name
@@ -92,6 +192,7 @@ def _save_uploaded_file(file: UploadFile) -> Path:
 @app.post("/upload")
 async def upload_document(file: UploadFile = File(...)) -> dict:
     """Upload a file into DATA_DIR and re-index all local documents."""
+    _require_writer()
     if not file.filename:
         raise HTTPException(status_code=400, detail="Missing filename.")
     try:
@@ -104,31 +205,37 @@ async def upload_document(file: UploadFile = File(...)) -> dict:
     finally:
         await file.close()
 
-    # Re-load and index all documents under DATA_DIR
+    # Re-load and index all documents under DATA_DIR (off the event loop so /ask keeps being served)
     try:
-        docs = load_documents(data_dir=DATA_DIR)
-        if not docs:
-            raise HTTPException(status_code=400, detail="No documents found after upload.")
-        chunks = add_documents(docs)
-    except HTTPException:
-        raise
+        n_docs, report = await asyncio.to_thread(_reindex)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to index documents: {e}")
-
-    return {"message": "Document uploaded and indexed.", "documents_indexed": len(docs), "chunks_added": chunks}
-
-
-def _reindex() -> int:
-    """Re-load and re-index all documents under DATA_DIR. Returns chunk count."""
-    docs = load_documents(data_dir=DATA_DIR)
-    if not docs:
-        return 0
-    return add_documents(docs)
+    if report is None:
+        raise HTTPException(status_code=400, detail="No documents found after upload.")
+
+    return {
+        "message": "Document uploaded and indexed.",
+        "documents_indexed": n_docs,
+        "chunks_added": report.stored,
+        "dedup": report.as_dict(),
+    }
+
+
+def _reindex() -> tuple[int, IngestReport | None]:
+    """Re-load and re-index all documents under DATA_DIR. Returns (documents loaded, ingest report)."""
+    # Hold the writer lock from load to publish: otherwise a re-index that loaded DATA_DIR earlier
+    # could publish after ours and drop files saved in between
+    with writer_lock():
+        docs = load_documents(data_dir=DATA_DIR)
+        if not docs:
+            return 0, None
+        return len(docs), add_documents(docs)
 
 
 @app.delete("/documents/{filename}")
 def delete_document(filename: str) -> dict:
     """Delete a document from DATA_DIR and re-index remaining documents."""
+    _require_writer()
     safe_name = Path(filename).name
     target = DATA_DIR / safe_name
     if not target.exists() or not target.is_file():
@@ -139,21 +246,51 @@ def delete_document(filename: str) -> dict:
         raise HTTPException(status_code=500, detail=f"Failed to delete file: {e}")
 
     try:
-        chunks = _reindex()
+        _, report = _reindex()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to re-index after deletion: {e}")
+    chunks = report.stored if report else 0
 
     return {"message": f"'{safe_name}' deleted.", "chunks_remaining": chunks}
 
 
+class ClientDisconnected(Exception):
+    pass
+
+
+async def _cancel_on_disconnect(request: Request, coro):
+    """Run coro, cancelling it (and its in-flight provider call) if the client disconnects."""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+            # Let the cancelled provider call unwind before the caller frees its admission slot
+            await asyncio.wait({task})
+
+
 @app.post("/ask", response_model=AskResponse)
-def ask(req: AskRequest) -> AskResponse:
+async def ask(req: AskRequest, request: Request) -> AskResponse:
     question = req.question.strip()
     if not question:
         raise HTTPException(status_code=400, detail="Question must not be empty.")
 
     try:
-        answer, sources = rag_query(question)
+        async with admission.slot():
+            answer, sources = await _cancel_on_disconnect(request, arag_query(question, filters=req.filters()))
+    except Rejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ClientDisconnected:
+        # Nobody is listening; 499 (client closed request) only shows up in access logs
+        raise HTTPException(status_code=499, detail="Client disconnected.")
     except ValueError as e:
         # Likely no API key / provider configured
         raise HTTPException(status_code=400, detail=str(e))
@@ -166,12 +303,60 @@ def ask(req: AskRequest) -> AskResponse:
             Source(
                 source=str(s.get("source", "")),
                 metadata=s.get("metadata") or {},
+                distance=s.get("distance"),
+                citations=s.get("citations"),
             )
         )
 
     return AskResponse(answer=answer, sources=out_sources)
 
 
+def _remove_file(path: str) -> None:
+    Path(path).unlink(missing_ok=True)
+
+
+@app.get("/snapshot")
+async def download_snapshot(dtype: str = "float32") -> FileResponse:
+    """Export the index as a snapshot archive (embeddings + documents + metadata, no Chroma internals)."""
+    fd, tmp = tempfile.mkstemp(suffix=".snap")
+    os.close(fd)
+    try:
+        manifest = await asyncio.to_thread(export_snapshot, tmp, dtype=dtype)
+    except ValueError as e:
+        _remove_file(tmp)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        _remove_file(tmp)
+        raise HTTPException(status_code=500, detail=f"Failed to export snapshot: {e}")
+    return FileResponse(
+        tmp,
+        media_type="application/zip",
+        filename=f"index-{manifest['index_version']}.snap",
+        background=BackgroundTask(_remove_file, tmp),
+    )
+
+
+@app.post("/snapshot")
+async def upload_snapshot(file: UploadFile = File(...), force: bool = False) -> dict:
+    """Replace the index with an uploaded snapshot. No embedding calls are made."""
+    _require_writer()
+    fd, tmp = tempfile.mkstemp(suffix=".snap")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(1 << 20):
+                out.write(chunk)
+        manifest = await asyncio.to_thread(import_snapshot, tmp, force=force)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to import snapshot: {e}")
+    finally:
+        await file.close()
+        _remove_file(tmp)
+
+    return {"message": "Snapshot imported.", "index_version": manifest["index_version"], "chunks": manifest["count"]}
+
+
 if __name__ == "__main__":
     import uvicorn
 
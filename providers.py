@@ -0,0 +1,82 @@
+"""LLM / embedding provider clients, imported and constructed lazily, cached per process."""
+from functools import lru_cache
+from typing import Any
+
+from app_config import (
+    GEMINI_API_KEY,
+    GEMINI_EMBED_MODEL,
+    OLLAMA_EMBED_MODEL,
+    OPENAI_API_KEY,
+    OPENAI_EMBEDDING_MODEL,
+    USE_GEMINI,
+    USE_OLLAMA,
+)
+
+
+NOT_CONFIGURED = "Set GEMINI_API_KEY+USE_GEMINI=true, or USE_OLLAMA=true, or OPENAI_API_KEY in .env"
+
+
+def provider_name() -> str:
+    """Return the configured provider: "gemini", "ollama" or "openai"."""
+    if USE_GEMINI:
+        return "gemini"
+    if USE_OLLAMA:
+        return "ollama"
+    return "openai"
+
+
+def embedding_identity() -> dict[str, str]:
+    """Provider + embedding model; vectors from different identities are not comparable."""
+    name = provider_name()
+    model = {"gemini": GEMINI_EMBED_MODEL, "ollama": OLLAMA_EMBED_MODEL, "openai": OPENAI_EMBEDDING_MODEL}[name]
+    return {"provider": name, "model": model}
+
+
+def ensure_configured() -> None:
+    """Raise ValueError if no provider is configured."""
+    if not USE_GEMINI and not USE_OLLAMA and not OPENAI_API_KEY:
+        raise ValueError(NOT_CONFIGURED)
+
+
+@lru_cache(maxsize=1)
+def gemini_client() -> Any:
+    from google.genai import Client
+    return Client(api_key=GEMINI_API_KEY)
+
+
+@lru_cache(maxsize=1)
+def openai_client() -> Any:
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+
+@lru_cache(maxsize=1)
+def openai_async_client() -> Any:
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+
+@lru_cache(maxsize=1)
+def ollama_module() -> Any:
+    import ollama
+    return ollama
+
+
+@lru_cache(maxsize=1)
+def ollama_async_client() -> Any:
+    return ollama_module().AsyncClient()
+
+
+def preload() -> str:
+    """Import the configured provider SDK and build its clients. Returns the provider name."""
+    ensure_configured()
+    name = provider_name()
+    if name == "gemini":
+        gemini_client()
+        from google.genai import types  # noqa: F401  (used by chat; import cost paid here)
+    elif name == "ollama":
+        ollama_async_client()
+    else:
+        openai_client()
+        openai_async_client()
+    return name
@@ -0,0 +1,183 @@
+"""
+Index snapshots: export the Chroma collection to a portable archive and bulk-load it elsewhere.
+Run: python snapshot.py export index.snap [--dtype float16]
+     python snapshot.py import index.snap [--force]
+
+The archive is a zip with
+- manifest.json   format/index version, provider + embedding model, shape, dtype, sha256 of each file
+- embeddings.npy  (count, dim) float32 or float16 array
+- records.json    ids, documents and metadatas, in the same order as the embeddings
+Importing needs no provider calls, so a new node can serve as soon as the load finishes.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Any
+
+from app_config import COLLECTION_NAME
+from generations import writer_lock
+from providers import embedding_identity
+from store import index_writer, open_collection, reading_client
+
+
+SNAPSHOT_FORMAT = 1
+_MANIFEST = "manifest.json"
+_EMBEDDINGS = "embeddings.npy"
+_RECORDS = "records.json"
+_DTYPES = ("float32", "float16")
+_MANIFEST_KEYS = ("format_version", "index_version", "embedding", "count", "dtype", "files")
+_RECORD_KEYS = ("ids", "documents", "metadatas")
+_PAGE_SIZE = 5000
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def export_snapshot(dest: str | Path, collection_name: str = COLLECTION_NAME, dtype: str = "float32") -> dict[str, Any]:
+    """Write the collection to `dest` (atomically). Returns the manifest."""
+    import numpy as np
+
+    if dtype not in _DTYPES:
+        raise ValueError(f"dtype must be one of {', '.join(_DTYPES)}.")
+    with reading_client() as client:  # keep the generation open for the whole export
+        coll = open_collection(collection_name, client)
+        if coll is None or not coll.count():
+            raise ValueError("Nothing is indexed; there is no snapshot to export.")
+
+        ids: list[str] = []
+        documents: list[str] = []
+        metadatas: list[dict[str, Any]] = []
+        vectors: list[Any] = []
+        total = coll.count()
+        for offset in range(0, total, _PAGE_SIZE):
+            page = coll.get(include=["embeddings", "documents", "metadatas"], limit=_PAGE_SIZE, offset=offset)
+            ids.extend(page["ids"])
+            documents.extend(page["documents"])
+            metadatas.extend(m or {} for m in page["metadatas"])
+            vectors.extend(page["embeddings"])
+
+    buf = io.BytesIO()
+    np.save(buf, np.asarray(vectors, dtype=dtype), allow_pickle=False)
+    emb_bytes = buf.getvalue()
+    records = {"ids": ids, "documents": documents, "metadatas": metadatas}
+    # Sorted keys: Chroma returns metadata keys in no fixed order, and the index version hashes these bytes
+    rec_bytes = json.dumps(records, ensure_ascii=False, sort_keys=True).encode()
+
+    files = {_EMBEDDINGS: _sha256(emb_bytes), _RECORDS: _sha256(rec_bytes)}
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT,
+        # Content-addressed: identical indexes get the same version on every node
+        "index_version": _sha256((files[_EMBEDDINGS] + files[_RECORDS]).encode())[:16],
+        "created_ts": time.time(),
+        "collection": collection_name,
+        "embedding": embedding_identity(),
+        "count": len(ids),
+        "dim": len(vectors[0]),
+        "dtype": dtype,
+        "files": files,
+    }
+
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(tmp, "w") as zf:
+            zf.writestr(_MANIFEST, json.dumps(manifest, indent=2), compress_type=zipfile.ZIP_DEFLATED)
+            zf.writestr(_EMBEDDINGS, emb_bytes, compress_type=zipfile.ZIP_STORED)  # floats barely compress
+            zf.writestr(_RECORDS, rec_bytes, compress_type=zipfile.ZIP_DEFLATED)
+        os.replace(tmp, dest)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return manifest
+
+
+def read_snapshot(src: str | Path, force: bool = False) -> tuple[dict[str, Any], Any, dict[str, list]]:
+    """Read and verify a snapshot. Returns (manifest, float32 embeddings, records). Raises ValueError if invalid."""
+    import numpy as np
+
+    try:
+        with zipfile.ZipFile(src) as zf:
+            manifest = json.loads(zf.read(_MANIFEST))
+            if manifest.get("format_version") != SNAPSHOT_FORMAT:
+                raise ValueError(f"Unsupported snapshot format {manifest.get('format_version')!r}.")
+            _require(manifest, _MANIFEST_KEYS, _MANIFEST)
+            _require(manifest["files"], (_EMBEDDINGS, _RECORDS), f"{_MANIFEST} files")
+            payload = {name: zf.read(name) for name in manifest["files"]}
+    except (zipfile.BadZipFile, KeyError, AttributeError, TypeError) as e:
+        raise ValueError(f"Not a valid snapshot: {e}") from None
+    for name, digest in manifest["files"].items():
+        if _sha256(payload[name]) != digest:
+            raise ValueError(f"Snapshot is corrupt: checksum mismatch for {name}.")
+    if not force and manifest["embedding"] != embedding_identity():
+        raise ValueError(
+            f"Snapshot was embedded with {manifest['embedding']}, but this node uses {embedding_identity()}. "
+            "Queries would not match; pass force to import anyway."
+        )
+
+    embeddings = np.load(io.BytesIO(payload[_EMBEDDINGS]), allow_pickle=False).astype(np.float32)
+    records = json.loads(payload[_RECORDS])
+    _require(records, _RECORD_KEYS, _RECORDS)
+    if not embeddings.shape[0] == len(records["ids"]) == len(records["documents"]) == len(records["metadatas"]):
+        raise ValueError("Snapshot is corrupt: embeddings and records differ in length.")
+    return manifest, embeddings, records
+
+
+def _require(obj: Any, keys: tuple[str, ...], what: str) -> None:
+    missing = [k for k in keys if k not in obj] if isinstance(obj, dict) else list(keys)
+    if missing:
+        raise ValueError(f"Not a valid snapshot: {what} is missing {', '.join(missing)}.")
+
+
+def import_snapshot(src: str | Path, collection_name: str = COLLECTION_NAME, force: bool = False) -> dict[str, Any]:
+    """Replace the collection with the snapshot's contents, without provider calls. Returns the manifest."""
+    manifest, embeddings, records = read_snapshot(src, force=force)
+    with index_writer(collection_name, clear_first=True) as add:
+        add(records["ids"], embeddings, records["documents"], records["metadatas"])
+    return manifest
+
+
+def bootstrap(src: str | Path, collection_name: str = COLLECTION_NAME) -> dict[str, Any] | None:
+    """Import `src` only if the collection is empty. Returns the manifest, or None if nothing was done."""
+    # Under the writer lock, so of several workers starting together only the first one imports.
+    # Allowed on read-only replicas: it is a one-time local load, not a serving write.
+    with writer_lock(local_bootstrap=True):
+        coll = open_collection(collection_name)
+        if coll is not None and coll.count():
+            return None
+        return import_snapshot(src, collection_name)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="write the index to a snapshot file")
+    p_export.add_argument("path")
+    p_export.add_argument("--dtype", choices=_DTYPES, default="float32")
+    p_import = sub.add_parser("import", help="replace the index with a snapshot file")
+    p_import.add_argument("path")
+    p_import.add_argument("--force", action="store_true", help="import even if the embedding model differs")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.command == "export":
+        manifest = export_snapshot(args.path, dtype=args.dtype)
+    else:
+        manifest = import_snapshot(args.path, force=args.force)
+    elapsed = time.perf_counter() - t0
+    print(
+        f"{args.command}ed {manifest['count']} chunks (index {manifest['index_version']}, "
+        f"{manifest['embedding']['provider']}/{manifest['embedding']['model']}, {manifest['dtype']}) in {elapsed:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,17 @@
 """Chroma vector store: embed chunks and run similarity search."""
+import asyncio
 import hashlib
-from typing import Any
-
-import chromadb
-from chromadb.config import Settings
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Iterator
 
 from app_config import (
-    CHROMA_PERSIST_DIR,
     COLLECTION_NAME,
+    DEDUP,
     GEMINI_EMBED_MODEL,
-    GEMINI_API_KEY,
     OPENAI_API_KEY,
     OPENAI_EMBEDDING_MODEL,
     OLLAMA_EMBED_MODEL,
@@ -19,13 +21,23 @@ from app_config import (
 )
 from ingest import Document
 from chunk import chunk_document
+from dedup import near_duplicate_clusters
+from generations import current as current_generation, discard, generation_dir, new_generation, publish, writer_lock
+from providers import (
+    NOT_CONFIGURED,
+    ensure_configured,
+    gemini_client,
+    ollama_async_client,
+    ollama_module,
+    openai_async_client,
+    openai_client,
+)
 
+if TYPE_CHECKING:  # chromadb is heavy; only import it when the store is first used
+    from chromadb.api import ClientAPI
 
-def _embed_gemini(texts: list[str]) -> list[list[float]]:
-    from google.genai import Client
-    client = Client(api_key=GEMINI_API_KEY)
-    contents = texts[0] if len(texts) == 1 else texts
-    result = client.models.embed_content(model=GEMINI_EMBED_MODEL, contents=contents)
+
+def _gemini_vectors(result: Any) -> list[list[float]]:
     embs = result.embeddings
     if not isinstance(embs, list):
         embs = [embs]
@@ -36,15 +48,19 @@ def _embed_gemini(texts: list[str]) -> list[list[float]]:
     return out
 
 
+def _embed_gemini(texts: list[str]) -> list[list[float]]:
+    contents = texts[0] if len(texts) == 1 else texts
+    return _gemini_vectors(gemini_client().models.embed_content(model=GEMINI_EMBED_MODEL, contents=contents))
+
+
 def _embed_openai(texts: list[str]) -> list[list[float]]:
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    client = openai_client()
     out = client.embeddings.create(input=texts, model=OPENAI_EMBEDDING_MODEL)
     return [d.embedding for d in out.data]
 
 
 def _embed_ollama(texts: list[str]) -> list[list[float]]:
-    import ollama
+    ollama = ollama_module()
     out = []
     for t in texts:
         r = ollama.embeddings(model=OLLAMA_EMBED_MODEL, prompt=t)
@@ -58,12 +74,116 @@ def _embed(texts: list[str]) -> list[list[float]]:
     if USE_OLLAMA:
         return _embed_ollama(texts)
     if not OPENAI_API_KEY:
-        raise ValueError("Set GEMINI_API_KEY + USE_GEMINI=true, or USE_OLLAMA=true, or OPENAI_API_KEY in .env")
+        raise ValueError(NOT_CONFIGURED)
     return _embed_openai(texts)
 
 
-def get_chroma_client() -> chromadb.PersistentClient:
-    return chromadb.PersistentClient(path=CHROMA_PERSIST_DIR, settings=Settings(anonymized_telemetry=False))
+async def _aembed_gemini(texts: list[str]) -> list[list[float]]:
+    contents = texts[0] if len(texts) == 1 else texts
+    return _gemini_vectors(await gemini_client().aio.models.embed_content(model=GEMINI_EMBED_MODEL, contents=contents))
+
+
+async def _aembed_openai(texts: list[str]) -> list[list[float]]:
+    out = await openai_async_client().embeddings.create(input=texts, model=OPENAI_EMBEDDING_MODEL)
+    return [d.embedding for d in out.data]
+
+
+async def _aembed_ollama(texts: list[str]) -> list[list[float]]:
+    client = ollama_async_client()
+    out = []
+    for t in texts:
+        r = await client.embeddings(model=OLLAMA_EMBED_MODEL, prompt=t)
+        out.append(r["embedding"])
+    return out
+
+
+async def _aembed(texts: list[str]) -> list[list[float]]:
+    """Async counterpart of _embed; cancelling the caller aborts the in-flight provider request."""
+    if USE_GEMINI:
+        return await _aembed_gemini(texts)
+    if USE_OLLAMA:
+        return await _aembed_ollama(texts)
+    if not OPENAI_API_KEY:
+        raise ValueError(NOT_CONFIGURED)
+    return await _aembed_openai(texts)
+
+
+# One client per generation directory, leased by the queries and writers using it. Clients beyond
+# the newest _OPEN_GENERATIONS are retired, and closed once their last lease is released.
+_clients: dict[str, "ClientAPI"] = {}
+_retired: dict[str, "ClientAPI"] = {}
+_leases: dict[str, int] = {}
+_clients_lock = threading.Lock()
+_OPEN_GENERATIONS = 3
+
+
+def _acquire(path: Path) -> tuple[str, "ClientAPI"]:
+    """Lease the client for a generation directory, opening it if needed. Pair with _release."""
+    import chromadb
+    from chromadb.config import Settings
+    key = str(path)
+    with _clients_lock:
+        client = _clients.pop(key, None) or _retired.pop(key, None)
+        if client is None:
+            client = chromadb.PersistentClient(path=key, settings=Settings(anonymized_telemetry=False))
+        _clients[key] = client  # (re)insert as newest
+        _leases[key] = _leases.get(key, 0) + 1
+        for stale in list(_clients)[:-_OPEN_GENERATIONS]:
+            stale_client = _clients.pop(stale)
+            if _leases.get(stale):
+                _retired[stale] = stale_client
+            else:
+                _close(stale_client)
+    return key, client
+
+
+def _release(key: str, forget: bool = False) -> None:
+    """Return a lease; close the client if it is retired (or forget=True) and no longer in use."""
+    with _clients_lock:
+        left = _leases.get(key, 0) - 1
+        if left > 0:
+            _leases[key] = left
+            return
+        _leases.pop(key, None)
+        if forget:
+            client = _clients.pop(key, None) or _retired.pop(key, None)
+        else:
+            client = _retired.pop(key, None)
+        if client is not None:
+            _close(client)
+
+
+def _acquire_current() -> tuple[str, "ClientAPI"]:
+    return _acquire(generation_dir(current_generation()))
+
+
+def _close(client: "ClientAPI") -> None:
+    close = getattr(client, "close", None)  # chromadb >= 1.1
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
+
+
+@contextmanager
+def reading_client() -> Iterator["ClientAPI"]:
+    """Client for the currently published generation, kept open until the block exits."""
+    key, client = _acquire_current()
+    try:
+        yield client
+    finally:
+        _release(key)
+
+
+def get_chroma_client() -> "ClientAPI":
+    """
+    Client for the currently published index generation (re-resolved on every call).
+    Not leased: use reading_client() for anything that may outlive a generation switch.
+    """
+    key, client = _acquire_current()
+    _release(key)
+    return client
 
 
 def _make_id(source: str, chunk_index: int, text_preview: str) -> str:
@@ -71,16 +191,146 @@ def _make_id(source: str, chunk_index: int, text_preview: str) -> str:
     return hashlib.sha256(raw.encode()).hexdigest()[:24]
 
 
-def add_documents(docs: list[Document], collection_name: str = COLLECTION_NAME, clear_first: bool = True) -> int:
-    """Chunk documents, embed, and add to Chroma. Returns number of chunks added."""
-    chroma = get_chroma_client()
-    if clear_first:
+# Cosine distances are comparable across providers, so one relevance threshold fits all
+_COLLECTION_METADATA = {"description": "RAG knowledge base", "hnsw:space": "cosine"}
+
+
+def _rebuild_as_cosine(client: "ClientAPI", coll: Any) -> Any:
+    """
+    Recreate a collection copied from an older (L2) generation with cosine distance.
+    Chroma can't change the space in place; stored embeddings are reused, so no provider calls.
+    """
+    batch_size = client.get_max_batch_size()
+    pages = [
+        coll.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        for offset in range(0, coll.count(), batch_size)
+    ]
+    client.delete_collection(coll.name)
+    coll = client.create_collection(name=coll.name, metadata=_COLLECTION_METADATA)
+    for page in pages:
+        coll.add(ids=page["ids"], embeddings=page["embeddings"], documents=page["documents"], metadatas=page["metadatas"])
+    return coll
+
+
+@contextmanager
+def index_writer(collection_name: str = COLLECTION_NAME, clear_first: bool = True) -> Iterator[Callable[..., None]]:
+    """
+    Yield add(ids, embeddings, documents, metadatas), which bulk-loads into the collection in a new,
+    unpublished index generation; publish it if the block succeeds.
+    Only one writer runs at a time across processes; readers keep serving the previous generation.
+    """
+    with writer_lock():
+        gen, path = new_generation(copy_current=not clear_first)
+        key, client = _acquire(path)
         try:
-            chroma.delete_collection(name=collection_name)
-        except Exception:
-            pass
-    coll = chroma.get_or_create_collection(name=collection_name, metadata={"description": "RAG knowledge base"})
+            coll = client.get_or_create_collection(name=collection_name, metadata=_COLLECTION_METADATA)
+            if (coll.metadata or {}).get("hnsw:space") != "cosine":
+                coll = _rebuild_as_cosine(client, coll)
+            yield partial(_bulk_add, coll, client.get_max_batch_size())
+        except BaseException:
+            _release(key, forget=True)
+            discard(path)
+            raise
+        _release(key)
+        publish(gen)
 
+
+def _bulk_add(
+    coll: Any, batch_size: int, ids: list[str], embeddings: Any, documents: list[str], metadatas: list[dict[str, Any]]
+) -> None:
+    """Add records in batches of batch_size (the largest the writer's client accepts)."""
+    for i in range(0, len(ids), batch_size):
+        j = i + batch_size
+        coll.add(ids=ids[i:j], embeddings=embeddings[i:j], documents=documents[i:j], metadatas=metadatas[i:j])
+
+
+@dataclass
+class IngestReport:
+    """Outcome of one add_documents run."""
+    chunks: int  # chunks produced by chunking
+    stored: int  # chunks embedded and stored after near-duplicate collapsing
+
+    @property
+    def duplicates(self) -> int:
+        return self.chunks - self.stored
+
+    @property
+    def dedup_ratio(self) -> float:
+        return self.duplicates / self.chunks if self.chunks else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "chunks": self.chunks,
+            "stored": self.stored,
+            "duplicates": self.duplicates,
+            "dedup_ratio": round(self.dedup_ratio, 4),
+        }
+
+
+# Filterable list fields: a collapsed chunk holds every member's values, so filters on any copy match it
+_MERGED_FIELDS = {"sources": "source", "source_types": "source_type", "path_prefixes": "path_prefixes"}
+
+
+def _filter_fields(metadatas: list[dict[str, Any]]) -> dict[str, Any]:
+    """Union of the members' filterable values (in member order), and the newest modified_ts."""
+    merged: dict[str, Any] = {}
+    for field, key in _MERGED_FIELDS.items():
+        values: list[str] = []
+        for meta in metadatas:
+            value = meta.get(key)
+            values.extend(value if isinstance(value, list) else [value] if value not in (None, "") else [])
+        if values:  # Chroma rejects empty lists
+            merged[field] = list(dict.fromkeys(str(v) for v in values))
+    modified = [m["modified_ts"] for m in metadatas if "modified_ts" in m]
+    if modified:
+        merged["modified_ts"] = max(modified)
+    return merged
+
+
+def _collapse_duplicates(
+    ids: list[str], texts: list[str], metadatas: list[dict[str, Any]]
+) -> tuple[list[str], list[str], list[dict[str, Any]]]:
+    """
+    Keep one chunk per near-duplicate cluster, with every member's sources and paths. The kept
+    chunk is the newest copy (highest modified_ts, else the first), so its text matches the
+    merged modified_ts. Members on different pages are kept apart: page ranges can't be filtered on a list.
+    """
+    out_ids, out_texts, out_metas = [], [], []
+    for cluster in near_duplicate_clusters(texts):
+        by_page: dict[Any, list[int]] = {}
+        for i in cluster:
+            by_page.setdefault(metadatas[i].get("page"), []).append(i)
+        for group in by_page.values():
+            keep = max(group, key=lambda i: metadatas[i].get("modified_ts", float("-inf")))
+            members = [keep] + [i for i in group if i != keep]
+            meta = {**metadatas[keep], **_filter_fields([metadatas[i] for i in members])}
+            if len(group) > 1:
+                meta["duplicate_count"] = len(group)
+            out_ids.append(ids[keep])
+            out_texts.append(texts[keep])
+            out_metas.append(meta)
+    return out_ids, out_texts, out_metas
+
+
+def _clean_meta(meta: dict[str, Any]) -> dict[str, Any]:
+    """Coerce values to what Chroma metadata accepts: scalars, or non-empty lists of strings."""
+    clean: dict[str, Any] = {}
+    for k, v in meta.items():
+        if isinstance(v, (str, int, float, bool)):
+            clean[k] = v
+        elif isinstance(v, list):
+            if v:
+                clean[k] = [str(x) for x in v]
+        else:
+            clean[k] = str(v)
+    return clean
+
+
+def add_documents(docs: list[Document], collection_name: str = COLLECTION_NAME, clear_first: bool = True) -> IngestReport:
+    """
+    Chunk documents, collapse near-duplicate chunks, embed, and publish them as a new index
+    generation (replacing the index if clear_first, else extending it).
+    """
     ids: list[str] = []
     texts: list[str] = []
     metadatas: list[dict[str, Any]] = []
@@ -90,42 +340,152 @@ def add_documents(docs: list[Document], collection_name: str = COLLECTION_NAME,
             doc_id = _make_id(doc.source, i, text)
             ids.append(doc_id)
             texts.append(text)
-            clean_meta = {k: (v if isinstance(v, (str, int, float, bool)) else str(v)) for k, v in meta.items()}
-            metadatas.append(clean_meta)
+            metadatas.append(_clean_meta(meta))
 
-    if not texts:
-        return 0
+    total = len(ids)
+    if DEDUP:
+        ids, texts, metadatas = _collapse_duplicates(ids, texts, metadatas)
+    else:
+        metadatas = [{**m, **_filter_fields([m])} for m in metadatas]
 
+    # index_writer only locks the bulk load; callers that load docs from shared state (DATA_DIR)
+    # must hold writer_lock across load + add_documents themselves, see main._reindex
     batch_size = 1 if USE_OLLAMA else 100
     all_embeddings: list[list[float]] = []
     for i in range(0, len(texts), batch_size):
         batch = texts[i : i + batch_size]
         all_embeddings.extend(_embed(batch))
 
-    coll.add(ids=ids, embeddings=all_embeddings, documents=texts, metadatas=metadatas)
-    return len(ids)
+    report = IngestReport(chunks=total, stored=len(ids))
+    if not texts and not clear_first:
+        return report
+    with index_writer(collection_name, clear_first) as add:
+        if texts:
+            add(ids, all_embeddings, texts, metadatas)
+    return report
 
 
-def query(
-    question: str,
-    top_k: int = TOP_K,
-    collection_name: str = COLLECTION_NAME,
-) -> list[dict[str, Any]]:
-    """Return top_k relevant chunks with content and source."""
-    if not USE_GEMINI and not USE_OLLAMA and not OPENAI_API_KEY:
-        raise ValueError("Set GEMINI_API_KEY+USE_GEMINI=true, or USE_OLLAMA=true, or OPENAI_API_KEY in .env")
-    chroma = get_chroma_client()
+@dataclass
+class SearchFilters:
+    """Metadata filters applied inside the vector search (Chroma `where`), before nearest-neighbor ranking."""
+    source: str | None = None
+    source_type: str | None = None  # "pdf", "text", "github", "notion", "gdrive"
+    path_prefix: str | None = None  # directory ("docs/api") or file path relative to data/ or the repo root
+    page_from: int | None = None
+    page_to: int | None = None
+    modified_after: float | None = None  # unix timestamp
+
+    def to_where(self) -> dict[str, Any] | None:
+        conds: list[dict[str, Any]] = []
+        # List fields, so a de-duplicated chunk matches a filter on any of its copies
+        if self.source:
+            conds.append({"sources": {"$contains": self.source}})
+        if self.source_type:
+            conds.append({"source_types": {"$contains": self.source_type}})
+        if self.path_prefix:
+            prefix = "/".join(p for p in self.path_prefix.split("/") if p)
+            if not prefix:
+                raise ValueError("path_prefix must name a directory or file; omit it to search everything.")
+            conds.append({"path_prefixes": {"$contains": prefix}})
+        if self.page_from is not None and self.page_to is not None and self.page_from > self.page_to:
+            raise ValueError("page_from must not be greater than page_to.")
+        if self.page_from is not None:
+            conds.append({"page": {"$gte": self.page_from}})
+        if self.page_to is not None:
+            conds.append({"page": {"$lte": self.page_to}})
+        if self.modified_after is not None:
+            conds.append({"modified_ts": {"$gt": self.modified_after}})
+        if not conds:
+            return None
+        return conds[0] if len(conds) == 1 else {"$and": conds}
+
+
+def open_collection(collection_name: str, client: "ClientAPI | None" = None) -> Any:
+    """Return the collection (from `client`, default: current generation), or None if nothing is indexed."""
     try:
-        coll = chroma.get_collection(name=collection_name)
+        return (client or get_chroma_client()).get_collection(name=collection_name)
     except Exception:
-        return []
+        return None
+
 
-    [q_embed] = _embed([question])
-    results = coll.query(query_embeddings=[q_embed], n_results=top_k, include=["documents", "metadatas"])
+def _search(coll: Any, q_embed: list[float], top_k: int, where: dict[str, Any] | None = None) -> list[dict[str, Any]]:
+    results = coll.query(
+        query_embeddings=[q_embed],
+        n_results=top_k,
+        where=where,
+        include=["documents", "metadatas", "distances"],
+    )
 
+    # Distances are only reported in cosine space: an index built before cosine (L2) would
+    # otherwise be judged against cosine thresholds until it is re-indexed
+    cosine = (coll.metadata or {}).get("hnsw:space") == "cosine"
     out = []
     docs = results["documents"][0] if results["documents"] else []
     metas = results["metadatas"][0] if results["metadatas"] else []
-    for doc, meta in zip(docs, metas):
-        out.append({"content": doc, "source": meta.get("source", ""), "metadata": meta or {}})
+    dists = results["distances"][0] if results["distances"] else []
+    for doc, meta, dist in zip(docs, metas, dists):
+        out.append({
+            "content": doc,
+            "source": meta.get("source", ""),
+            "metadata": meta or {},
+            "distance": dist if cosine else None,
+        })
     return out
+
+
+# Each of these leases and releases within one worker-thread call: cancelling the awaiting task
+# can't strand a lease, because the thread itself runs to completion
+def _is_indexed(collection_name: str) -> bool:
+    with reading_client() as client:
+        coll = open_collection(collection_name, client)
+        return coll is not None and coll.count() > 0
+
+
+def _search_current(collection_name: str, q_embed: list[float], top_k: int, where: dict[str, Any] | None) -> list[dict[str, Any]]:
+    """Search the current generation, holding its client for the duration of the search."""
+    with reading_client() as client:
+        coll = open_collection(collection_name, client)
+        return [] if coll is None else _search(coll, q_embed, top_k, where)
+
+
+def query(
+    question: str,
+    top_k: int = TOP_K,
+    collection_name: str = COLLECTION_NAME,
+    filters: SearchFilters | None = None,
+) -> list[dict[str, Any]]:
+    """Return top_k nearest chunks (content, source, distance), optionally restricted by metadata filters."""
+    ensure_configured()
+    where = filters.to_where() if filters else None
+    with reading_client() as client:
+        coll = open_collection(collection_name, client)
+        if coll is None:
+            return []
+
+        [q_embed] = _embed([question])
+        return _search(coll, q_embed, top_k, where)
+
+
+async def aquery(
+    question: str,
+    top_k: int = TOP_K,
+    collection_name: str = COLLECTION_NAME,
+    filters: SearchFilters | None = None,
+) -> list[dict[str, Any]]:
+    """Async query: the embedding call is awaited, blocking Chroma calls run in a worker thread."""
+    ensure_configured()
+    where = filters.to_where() if filters else None
+    if not await asyncio.to_thread(_is_indexed, collection_name):
+        return []
+
+    [q_embed] = await _aembed([question])
+    return await asyncio.to_thread(_search_current, collection_name, q_embed, top_k, where)
+
+
+async def warm_up(collection_name: str = COLLECTION_NAME) -> None:
+    """
+    Open the collection and run a throwaway aquery, the path /ask uses, on the calling (serving)
+    event loop, so the first real request finds the async embedding client connected.
+    """
+    if await asyncio.to_thread(_is_indexed, collection_name):
+        await aquery("warm-up", top_k=1, collection_name=collection_name)
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from admission import AdmissionController, Rejected
+
+
+def test_rejects_immediately_when_queue_is_full():
+    async def run():
+        admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=5)
+        release = asyncio.Event()
+
+        async def hold():
+            async with admission.slot():
+                await release.wait()
+
+        running = asyncio.create_task(hold())
+        queued = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert admission.in_flight == 2
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(Rejected, match="too many"):
+            async with admission.slot():
+                pass
+        assert loop.time() - started < 1  # rejected without waiting for queue_timeout
+
+        release.set()
+        await asyncio.gather(running, queued)
+        assert admission.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_rejects_when_queue_wait_times_out():
+    async def run():
+        admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+        release = asyncio.Event()
+
+        async def hold():
+            async with admission.slot():
+                await release.wait()
+
+        running = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(Rejected, match="no slot freed up"):
+            async with admission.slot():
+                pass
+        assert admission.in_flight == 1
+
+        release.set()
+        await running
+
+    asyncio.run(run())
+
+
+def test_ask_returns_429_with_retry_after_when_full(monkeypatch):
+    monkeypatch.setattr(main, "admission", AdmissionController(max_concurrency=0, max_queue=0, queue_timeout=1))
+
+    response = TestClient(main.app).post("/ask", json={"question": "anything"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from functools import partial
+
+import pytest
+from fastapi.testclient import TestClient
+
+import chat
+import main
+from admission import AdmissionController
+
+CHUNKS = [{"content": "Chroma stores embeddings.", "source": "notes.md", "metadata": {}, "distance": 0.1}]
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """Stub retrieval and a slow chat provider; records whether the provider call was cancelled."""
+    calls = {"started": 0, "cancelled": 0, "in_flight_while_unwinding": None}
+
+    async def fake_aquery(question, top_k, filters=None):
+        return CHUNKS
+
+    async def slow_achat(user_message):
+        calls["started"] += 1
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            calls["cancelled"] += 1
+            await asyncio.sleep(0.05)  # the SDK closing its connection
+            calls["in_flight_while_unwinding"] = main.admission.in_flight
+            raise
+        return "too late"
+
+    monkeypatch.setattr(chat, "ensure_configured", lambda: None)
+    monkeypatch.setattr(chat, "store_aquery", fake_aquery)
+    monkeypatch.setattr(chat, "_achat", slow_achat)
+    monkeypatch.setattr(main, "admission", AdmissionController(max_concurrency=2, max_queue=2, queue_timeout=1))
+    return calls
+
+
+def test_slow_generation_is_a_504(provider, monkeypatch):
+    monkeypatch.setattr(main, "arag_query", partial(chat.arag_query, generation_timeout=0.05))
+
+    response = TestClient(main.app).post("/ask", json={"question": "What stores embeddings?"})
+
+    assert response.status_code == 504
+    assert response.json()["detail"] == "generation timed out after 0.05s"
+    assert provider["cancelled"] == 1
+    assert main.admission.in_flight == 0
+
+
+async def _ask_and_disconnect(body: dict) -> list[dict]:
+    """Drive /ask over raw ASGI: send the body, then report the client as gone."""
+    payload = json.dumps(body).encode()
+    messages = [{"type": "http.request", "body": payload, "more_body": False}]
+    sent: list[dict] = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/ask",
+        "raw_path": b"/ask",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+        "client": ("127.0.0.1", 12345),
+        "server": ("testserver", 80),
+    }
+    await main.app(scope, receive, send)
+    return sent
+
+
+def test_disconnect_cancels_the_provider_call(provider, monkeypatch):
+    monkeypatch.setattr(main, "DISCONNECT_POLL_INTERVAL", 0.01)
+
+    sent = asyncio.run(_ask_and_disconnect({"question": "What stores embeddings?"}))
+
+    assert sent[0]["status"] == 499
+    assert provider == {"started": 1, "cancelled": 1, "in_flight_while_unwinding": 1}
+    assert main.admission.in_flight == 0
+
+
+def test_warm_up_runs_the_async_query_path(monkeypatch):
+    import store
+
+    queries = []
+
+    async def fake_aquery(question, top_k, collection_name):
+        queries.append((question, asyncio.get_running_loop()))
+        return []
+
+    monkeypatch.setattr(chat, "preload", lambda: "openai")
+    monkeypatch.setattr(store, "_is_indexed", lambda collection_name: True)
+    monkeypatch.setattr(store, "aquery", fake_aquery)
+
+    async def run():
+        assert await chat.warm_up() == "openai"
+        return asyncio.get_running_loop()
+
+    loop = asyncio.run(run())
+    assert queries == [("warm-up", loop)]
@@ -0,0 +1,76 @@
+from dedup import near_duplicate_clusters
+from store import _collapse_duplicates
+
+BASE = (
+    "Chroma stores each chunk with its embedding and metadata. Queries embed the question and "
+    "return the nearest chunks, which are passed to the model as context for the answer."
+)
+OTHER = "Admission control bounds how many questions run at once and rejects the rest with 429."
+
+
+def test_clusters_group_near_duplicates_in_input_order():
+    texts = [OTHER, BASE, "Something else entirely about PDF page numbers.", BASE.replace("answer.", "answer!"), BASE]
+
+    clusters = near_duplicate_clusters(texts)
+
+    assert clusters == [[0], [1, 3, 4], [2]]
+
+
+def test_every_text_is_in_exactly_one_cluster():
+    texts = [BASE, OTHER, BASE, OTHER, "unique"]
+
+    clusters = near_duplicate_clusters(texts)
+
+    assert sorted(i for c in clusters for i in c) == list(range(len(texts)))
+    assert [c[0] for c in clusters] == sorted(c[0] for c in clusters)
+
+
+def test_threshold_one_keeps_only_exact_copies():
+    assert near_duplicate_clusters([BASE, BASE + " Extra words.", BASE], threshold=1.0) == [[0, 2], [1]]
+
+
+def test_empty_input():
+    assert near_duplicate_clusters([]) == []
+
+
+def test_collapsed_chunk_keeps_every_copy_filterable():
+    metas = [
+        {"source": "b.md", "source_type": "text", "path_prefixes": ["docs", "docs/b.md"], "modified_ts": 1.0},
+        {"source": "a.md", "source_type": "text", "path_prefixes": ["docs", "docs/api", "docs/api/a.md"], "modified_ts": 2.0},
+    ]
+
+    ids, texts, out = _collapse_duplicates(["b", "a"], [BASE, BASE], metas)
+
+    assert ids == ["a"]  # the newer copy
+    assert out[0]["source"] == "a.md"
+    assert out[0]["sources"] == ["a.md", "b.md"]
+    assert out[0]["path_prefixes"] == ["docs", "docs/api", "docs/api/a.md", "docs/b.md"]
+    assert out[0]["modified_ts"] == 2.0
+    assert out[0]["duplicate_count"] == 2
+
+
+def test_newest_copy_text_is_kept():
+    older, newer = BASE, BASE.replace("answer.", "answer!")
+    metas = [{"source": "v1.md", "modified_ts": 10.0}, {"source": "v2.md", "modified_ts": 20.0}, {"source": "v0.md"}]
+
+    ids, texts, out = _collapse_duplicates(["v1", "v2", "v0"], [older, newer, older], metas)
+
+    assert (ids, texts) == (["v2"], [newer])
+    assert out[0]["modified_ts"] == 20.0
+
+
+def test_first_copy_is_kept_without_timestamps():
+    ids, _, out = _collapse_duplicates(["x", "y"], [BASE, BASE], [{"source": "x.md"}, {"source": "y.md"}])
+
+    assert ids == ["x"]
+    assert "modified_ts" not in out[0]
+
+
+def test_copies_on_different_pages_are_not_collapsed():
+    metas = [{"source": "v1.pdf", "page": 1}, {"source": "v2.pdf", "page": 2}, {"source": "v3.pdf", "page": 1}]
+
+    ids, _, out = _collapse_duplicates(["p1", "p2", "p3"], [BASE] * 3, metas)
+
+    assert ids == ["p1", "p2"]
+    assert out[0]["sources"] == ["v1.pdf", "v3.pdf"]
+    assert out[1]["sources"] == ["v2.pdf"]
@@ -0,0 +1,53 @@
+import pytest
+
+from chat import NO_DOCUMENTS_ANSWER, NO_MATCHING_ANSWER, _no_chunks_answer
+from chunk import path_prefixes
+from store import SearchFilters
+
+
+def test_no_filters():
+    assert SearchFilters().to_where() is None
+    assert SearchFilters(source="", path_prefix="").to_where() is None
+
+
+def test_single_filter_is_not_wrapped():
+    assert SearchFilters(source="README.md").to_where() == {"sources": {"$contains": "README.md"}}
+
+
+def test_filters_are_combined_with_and():
+    where = SearchFilters(source_type="pdf", page_from=2, page_to=4, modified_after=10.0).to_where()
+
+    assert where == {
+        "$and": [
+            {"source_types": {"$contains": "pdf"}},
+            {"page": {"$gte": 2}},
+            {"page": {"$lte": 4}},
+            {"modified_ts": {"$gt": 10.0}},
+        ]
+    }
+
+
+@pytest.mark.parametrize("prefix", ["docs/api", "/docs/api/", "docs//api"])
+def test_path_prefix_is_normalized(prefix):
+    assert SearchFilters(path_prefix=prefix).to_where() == {"path_prefixes": {"$contains": "docs/api"}}
+
+
+def test_path_prefix_matches_stored_prefixes():
+    assert path_prefixes("docs/api/a.md") == ["docs", "docs/api", "docs/api/a.md"]
+
+
+@pytest.mark.parametrize("prefix", ["/", "//"])
+def test_root_path_prefix_is_rejected(prefix):
+    with pytest.raises(ValueError, match="path_prefix"):
+        SearchFilters(path_prefix=prefix).to_where()
+
+
+def test_inverted_page_range_is_rejected():
+    with pytest.raises(ValueError, match="page_from"):
+        SearchFilters(page_from=5, page_to=1).to_where()
+
+
+def test_empty_result_answer_depends_on_filters():
+    assert _no_chunks_answer(None) == NO_DOCUMENTS_ANSWER
+    assert _no_chunks_answer(SearchFilters()) == NO_DOCUMENTS_ANSWER
+    assert _no_chunks_answer(SearchFilters(source_type="notion")) == NO_MATCHING_ANSWER
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+import generations
+import store
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    monkeypatch.setattr(generations, "ROOT", tmp_path)
+    return tmp_path
+
+
+def _build(copy_current: bool = False) -> str:
+    with generations.writer_lock():
+        gen, path = generations.new_generation(copy_current)
+        (path / "chroma.sqlite3").write_text(gen)
+        generations.publish(gen)
+    return gen
+
+
+def test_publish_swaps_current_atomically(root, monkeypatch):
+    old = _build()
+    real_replace = os.replace
+    seen = []
+
+    def replace(src, dst):
+        seen.append(generations.current())  # readers still see the old generation until the swap
+        real_replace(src, dst)
+
+    monkeypatch.setattr(generations.os, "replace", replace)
+    new = _build()
+
+    assert seen == [old]
+    assert generations.current() == new
+    assert not list(root.glob("CURRENT.*"))
+
+
+def test_publish_keeps_newest_generations(root):
+    gens = [_build() for _ in range(generations.KEEP_GENERATIONS + 2)]
+
+    kept = sorted(p.name for p in root.glob("gen-*"))
+    assert kept == gens[-generations.KEEP_GENERATIONS :]
+    assert generations.current() == gens[-1]
+
+
+def test_new_generation_copies_current(root):
+    first = _build()
+    with generations.writer_lock():
+        _, path = generations.new_generation(copy_current=True)
+    assert (path / "chroma.sqlite3").read_text() == first
+    assert not (path / "CURRENT").exists()
+
+
+def test_read_only_replica_may_only_bootstrap(root, monkeypatch):
+    monkeypatch.setattr(generations, "INDEX_READ_ONLY", True)
+    with pytest.raises(generations.ReadOnlyIndex):
+        with generations.writer_lock():
+            pass
+    with generations.writer_lock(local_bootstrap=True):
+        with generations.writer_lock():  # nested writes inside the bootstrap are allowed
+            pass
+
+
+def test_retired_client_stays_open_until_released(tmp_path, monkeypatch):
+    closed = []
+    monkeypatch.setattr(store, "_close", closed.append)
+    monkeypatch.setattr(store, "_clients", {})
+    monkeypatch.setattr(store, "_retired", {})
+    monkeypatch.setattr(store, "_leases", {})
+
+    key, client = store._acquire(tmp_path / "gen-0")  # a slow query on the old generation
+    for n in range(1, store._OPEN_GENERATIONS + 1):
+        store._release(store._acquire(tmp_path / f"gen-{n}")[0])
+
+    assert client not in closed
+    store._release(key)
+    assert client in closed
+
+
+def test_cancelled_query_does_not_strand_its_lease(root, monkeypatch):
+    acquire = store._acquire
+
+    def slow_acquire(path):
+        time.sleep(0.2)  # e.g. opening the client of a freshly published generation
+        return acquire(path)
+
+    monkeypatch.setattr(store, "ensure_configured", lambda: None)
+    monkeypatch.setattr(store, "_acquire", slow_acquire)
+    monkeypatch.setattr(store, "_clients", {})
+    monkeypatch.setattr(store, "_retired", {})
+    monkeypatch.setattr(store, "_leases", {})
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(store.aquery("q"), 0.05)
+        await asyncio.sleep(0.4)  # the worker thread finishes on its own
+
+    asyncio.run(run())
+    assert store._leases == {}
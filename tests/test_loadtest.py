@@ -0,0 +1,36 @@
+import pytest
+
+from loadtest import Sample, StageResult, StubLatency, percentile, summarize
+
+
+def test_percentile_nearest_rank():
+    values = [0.5, 0.1, 0.4, 0.2, 0.3]
+    assert percentile(values, 50) == 0.3
+    assert percentile(values, 95) == 0.5
+    assert percentile(values, 0) == 0.1
+    assert percentile(list(range(1, 101)), 99) == 99
+    assert percentile([], 50) == 0.0
+
+
+def test_summarize_counts_only_successes_in_latency_and_throughput():
+    samples = [Sample("/ask", 200, 0.1), Sample("/ask", 200, 0.3), Sample("/ask", 429, 0.001), Sample("/ask", 0, 5.0)]
+    samples.append(Sample("/upload", 200, 2.0))
+
+    summary = summarize(StageResult(concurrency=4, elapsed=2.0, samples=samples))
+
+    assert summary["concurrency"] == 4
+    ask = summary["endpoints"]["/ask"]
+    assert ask["requests"] == 4
+    assert ask["throughput_rps"] == 1.0
+    assert ask["error_rate"] == 0.5
+    assert (ask["p50_ms"], ask["p99_ms"]) == (100.0, 300.0)
+    assert ask["statuses"] == {"200": 2, "429": 1, "0": 1}
+    assert summary["endpoints"]["/upload"]["p95_ms"] == 2000.0
+
+
+def test_stub_latency_samples_its_own_means():
+    latency = StubLatency(embed=0.0, llm=1.0)
+    assert latency.sample("embed") == 0.0
+    assert latency.sample("llm") >= 0.0
+    with pytest.raises(AttributeError):
+        latency.sample("rerank")
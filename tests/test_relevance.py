@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+import chat
+from chat import NO_RELEVANT_ANSWER, _search_k, select_relevant
+
+
+def _chunks(*distances):
+    return [{"content": f"c{i}", "source": f"s{i}", "metadata": {}, "distance": d} for i, d in enumerate(distances)]
+
+
+def _kept(chunks):
+    return [c["distance"] for c in chunks]
+
+
+def test_no_gate_keeps_everything():
+    assert _kept(select_relevant(_chunks(0.1, 0.9, 1.5), None, None)) == [0.1, 0.9, 1.5]
+
+
+def test_max_distance_only():
+    assert _kept(select_relevant(_chunks(0.1, 0.4, 0.6), 0.5, None)) == [0.1, 0.4]
+
+
+def test_margin_only_is_relative_to_best_hit():
+    assert _kept(select_relevant(_chunks(0.7, 0.8, 0.95), None, 0.15)) == [0.7, 0.8]
+
+
+def test_both_take_the_tighter_limit():
+    assert _kept(select_relevant(_chunks(0.1, 0.2, 0.3, 0.45), 0.4, 0.15)) == [0.1, 0.2]
+    assert _kept(select_relevant(_chunks(0.3, 0.4, 0.5), 0.45, 0.5)) == [0.3, 0.4]
+
+
+def test_no_survivors():
+    assert select_relevant(_chunks(0.8, 0.9), 0.5, None) == []
+
+
+def test_without_distances_keeps_top_k():
+    chunks = _chunks(None, None, None)
+    assert select_relevant(chunks, 0.5, 0.1, top_k=2) == chunks[:2]
+
+
+def test_search_widens_only_when_gated(monkeypatch):
+    monkeypatch.setattr(chat, "RELEVANCE_MAX_K", 10)
+    assert _search_k(5, None, None) == 5
+    assert _search_k(5, 0.5, None) == 10
+    assert _search_k(5, None, 0.1) == 10
+    assert _search_k(12, 0.5, 0.1) == 12
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    calls = {"top_k": [], "chat": 0}
+
+    async def fake_aquery(question, top_k, filters=None):
+        calls["top_k"].append(top_k)
+        return _chunks(0.8, 0.9)
+
+    async def fake_achat(user_message):
+        calls["chat"] += 1
+        return "answer"
+
+    monkeypatch.setattr(chat, "ensure_configured", lambda: None)
+    monkeypatch.setattr(chat, "store_aquery", fake_aquery)
+    monkeypatch.setattr(chat, "_achat", fake_achat)
+    monkeypatch.setattr(chat, "RELEVANCE_MAX_K", 10)
+    return calls
+
+
+def test_nothing_relevant_skips_the_llm(pipeline):
+    answer, sources = asyncio.run(chat.arag_query("q", top_k=5, max_distance=0.5, margin=None))
+
+    assert (answer, sources) == (NO_RELEVANT_ANSWER, [])
+    assert pipeline["chat"] == 0
+    assert pipeline["top_k"] == [10]
+
+
+def test_relevant_chunks_reach_the_llm(pipeline):
+    answer, sources = asyncio.run(chat.arag_query("q", top_k=5, max_distance=None, margin=0.05))
+
+    assert answer == "answer"
+    assert [s["distance"] for s in sources] == [0.8]
+    assert pipeline["chat"] == 1
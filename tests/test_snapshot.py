@@ -0,0 +1,135 @@
+import json
+import zipfile
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import generations
+import main
+import snapshot
+from snapshot import export_snapshot, import_snapshot, read_snapshot
+from store import index_writer, open_collection
+
+IDENTITY = {"provider": "openai", "model": "text-embedding-3-small"}
+COLLECTION = "kb_test"
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    """An index with three records under a temporary CHROMA_PERSIST_DIR."""
+    monkeypatch.setattr(generations, "ROOT", tmp_path / "chroma")
+    monkeypatch.setattr(snapshot, "embedding_identity", lambda: IDENTITY)
+    vectors = np.random.default_rng(0).random((3, 8), dtype=np.float32)
+    records = {
+        "ids": ["a", "b", "c"],
+        "documents": ["alpha", "beta", "gamma"],
+        "metadatas": [{"source": "a.md", "sources": ["a.md"]}, {"source": "b.pdf", "page": 2}, {"source": "c.md"}],
+    }
+    with index_writer(COLLECTION) as add:
+        add(records["ids"], vectors, records["documents"], records["metadatas"])
+    return vectors, records
+
+
+def _contents():
+    coll = open_collection(COLLECTION)
+    got = coll.get(include=["embeddings", "documents", "metadatas"])
+    order = np.argsort(got["ids"])
+    return (
+        [got["ids"][i] for i in order],
+        [got["documents"][i] for i in order],
+        [got["metadatas"][i] for i in order],
+        np.asarray(got["embeddings"])[order],
+    )
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 1e-6), ("float16", 1e-3)])
+def test_round_trip(index, tmp_path, dtype, tolerance):
+    vectors, records = index
+    path = tmp_path / "index.snap"
+
+    exported = export_snapshot(path, COLLECTION, dtype=dtype)
+    with index_writer(COLLECTION) as add:  # replace the index with something else
+        add(["z"], np.zeros((1, 8), dtype=np.float32), ["other"], [{"source": "z.md"}])
+    imported = import_snapshot(path, COLLECTION)
+
+    assert imported == exported
+    assert exported["count"] == 3 and exported["dtype"] == dtype
+    ids, documents, metadatas, embeddings = _contents()
+    assert ids == records["ids"]
+    assert documents == records["documents"]
+    assert metadatas == records["metadatas"]
+    np.testing.assert_allclose(embeddings, vectors, atol=tolerance)
+
+
+def test_index_version_is_content_addressed(index, tmp_path):
+    first = export_snapshot(tmp_path / "1.snap", COLLECTION)
+    second = export_snapshot(tmp_path / "2.snap", COLLECTION)
+    assert first["index_version"] == second["index_version"]
+
+
+def _rewrite(src, dest, **replace):
+    """Copy a snapshot archive, replacing some members verbatim (without fixing checksums)."""
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dest, "w") as zout:
+        for name in zin.namelist():
+            zout.writestr(name, replace.get(name, zin.read(name)))
+
+
+def _manifest(path):
+    with zipfile.ZipFile(path) as zf:
+        return json.loads(zf.read("manifest.json"))
+
+
+def test_checksum_mismatch_is_rejected(index, tmp_path):
+    export_snapshot(tmp_path / "index.snap", COLLECTION)
+    _rewrite(tmp_path / "index.snap", tmp_path / "bad.snap", **{"records.json": b'{"ids": [], "documents": [], "metadatas": []}'})
+
+    with pytest.raises(ValueError, match="checksum mismatch for records.json"):
+        read_snapshot(tmp_path / "bad.snap")
+
+
+def test_embedding_identity_mismatch_needs_force(index, tmp_path, monkeypatch):
+    export_snapshot(tmp_path / "index.snap", COLLECTION)
+    monkeypatch.setattr(snapshot, "embedding_identity", lambda: {"provider": "ollama", "model": "nomic-embed-text"})
+
+    with pytest.raises(ValueError, match="pass force"):
+        read_snapshot(tmp_path / "index.snap")
+    manifest, embeddings, records = read_snapshot(tmp_path / "index.snap", force=True)
+    assert manifest["embedding"] == IDENTITY
+    assert embeddings.shape == (3, 8) and embeddings.dtype == np.float32
+
+
+def test_unsupported_format_version_is_rejected(index, tmp_path):
+    export_snapshot(tmp_path / "index.snap", COLLECTION)
+    manifest = {**_manifest(tmp_path / "index.snap"), "format_version": 99}
+    _rewrite(tmp_path / "index.snap", tmp_path / "future.snap", **{"manifest.json": json.dumps(manifest)})
+
+    with pytest.raises(ValueError, match="Unsupported snapshot format 99"):
+        read_snapshot(tmp_path / "future.snap")
+
+
+@pytest.mark.parametrize("drop", ["embedding", "files"])
+def test_incomplete_manifest_is_rejected(index, tmp_path, drop):
+    export_snapshot(tmp_path / "index.snap", COLLECTION)
+    manifest = _manifest(tmp_path / "index.snap")
+    del manifest[drop]
+    _rewrite(tmp_path / "index.snap", tmp_path / "bad.snap", **{"manifest.json": json.dumps(manifest)})
+
+    with pytest.raises(ValueError, match=f"missing {drop}"):
+        read_snapshot(tmp_path / "bad.snap")
+
+
+def test_malformed_snapshot_upload_is_a_400(index, tmp_path):
+    export_snapshot(tmp_path / "index.snap", COLLECTION)
+    records = b'{"ids": ["a"]}'
+    manifest = _manifest(tmp_path / "index.snap")
+    manifest["files"]["records.json"] = snapshot._sha256(records)
+    _rewrite(
+        tmp_path / "index.snap", tmp_path / "bad.snap", **{"manifest.json": json.dumps(manifest), "records.json": records}
+    )
+
+    with open(tmp_path / "bad.snap", "rb") as f:
+        response = TestClient(main.app).post("/snapshot", files={"file": ("bad.snap", f)})
+
+    assert response.status_code == 400
+    assert "records.json is missing documents, metadatas" in response.json()["detail"]